@@ -0,0 +1,162 @@
+"""
+Pooled database connections.
+
+``billing_system.db_pool.mysql`` (and ``.sqlite3`` as a local stand-in) are
+Django database backends whose connections are handed back to a per-process
+pool when Django closes them at the end of a request, and taken from it on the
+next connect. This saves a TCP + auth handshake per request. Configure with the
+``POOL`` key of the database settings (see ``DB_POOL*`` in settings.py):
+
+* ``SIZE`` - idle connections kept per process; extra ones are closed on return.
+* ``IDLE_TIMEOUT`` - idle connections older than this (seconds) are closed
+  instead of reused; keep it below the server's ``wait_timeout``.
+* ``HEALTH_CHECK_AFTER`` - connections idle for longer are pinged before reuse.
+
+Connections are rolled back before going back to the pool; ones that raised
+a non-data error are checked first and dropped if unusable. A forked child
+(bulk export workers) never reuses its parent's sockets. Every checkout sends
+``connection_checked_out`` with ``reused`` and ``duration`` for the request
+metrics.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from django.dispatch import Signal
+
+connection_checked_out = Signal()
+
+DEFAULTS = {
+    "SIZE": 5,
+    "IDLE_TIMEOUT": 300,
+    "HEALTH_CHECK_AFTER": 30,
+}
+
+
+class ConnectionPool:
+    def __init__(self, size, idle_timeout, health_check_after):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+        self._idle = deque()  # (raw connection, returned at)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Sockets inherited from the parent must not be used, or closed, here.
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._pid = os.getpid()
+
+    def checkout(self, is_usable):
+        while True:
+            with self._lock:
+                self._check_fork()
+                if not self._idle:
+                    return None
+                raw, returned_at = self._idle.pop()  # most recently used first
+            idle = time.monotonic() - returned_at
+            if self.idle_timeout and idle > self.idle_timeout:
+                self.discard(raw)
+                continue
+            if idle > self.health_check_after and not is_usable(raw):
+                self.discard(raw)
+                continue
+            with self._lock:
+                self.stats["reused"] += 1
+            return raw
+
+    def checkin(self, raw):
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.size:
+                self._idle.append((raw, time.monotonic()))
+                return
+        self.discard(raw)
+
+    def discard(self, raw):
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "idle": len(self._idle), "size": self.size}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                config = {**DEFAULTS, **(settings_dict.get("POOL") or {})}
+                pool = _pools[alias] = ConnectionPool(
+                    config["SIZE"], config["IDLE_TIMEOUT"], config["HEALTH_CHECK_AFTER"],
+                )
+    return pool
+
+
+def pool_stats():
+    return {alias: pool.snapshot() for alias, pool in _pools.items()}
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixed into a backend's ``DatabaseWrapper`` ahead of the vendor class."""
+
+    def _pool_enabled(self):
+        return True
+
+    def _pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def _raw_is_usable(self, raw):
+        try:
+            if hasattr(raw, "ping"):
+                raw.ping()
+            else:
+                raw.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        if not self._pool_enabled():
+            return super().get_new_connection(conn_params)
+        start = time.perf_counter()
+        pool = self._pool()
+        raw = pool.checkout(self._raw_is_usable)
+        reused = raw is not None
+        if raw is None:
+            raw = super().get_new_connection(conn_params)
+            with pool._lock:
+                pool.stats["created"] += 1
+        connection_checked_out.send(
+            sender=self.__class__, alias=self.alias, reused=reused, duration=time.perf_counter() - start,
+        )
+        return raw
+
+    def _close(self):
+        if self.connection is None or not self._pool_enabled():
+            return super()._close()
+        raw = self.connection
+        pool = self._pool()
+        if self.errors_occurred and not self._raw_is_usable(raw):
+            pool.discard(raw)
+            return
+        try:
+            raw.rollback()
+        except Exception:
+            pool.discard(raw)
+            return
+        pool.checkin(raw)
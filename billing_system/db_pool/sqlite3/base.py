@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+from billing_system.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    # Local stand-in for the MySQL pool (benchmarks, development).
+    def _pool_enabled(self):
+        return not self.is_in_memory_db()
@@ -47,6 +47,7 @@ LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
 MIDDLEWARE = [
+    'invoices.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +61,8 @@ ROOT_URLCONF = 'billing_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that records template render time (invoices/metrics.py)
+        'BACKEND': 'invoices.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,9 +90,35 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '3306'),
+        # Persistent connections; 0 closes the connection after each request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
+# Local SQLite stand-in, e.g. for `manage.py bench_suite` without a MySQL server
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        # A file rather than the in-memory default, so threads in a
+        # TransactionTestCase get their own connections to one database.
+        'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
+    }
+
+# Pooled connections (billing_system/db_pool): each request takes a connection
+# from a per-process pool and hands it back when Django closes it.
+if os.environ.get('DB_POOL') == '1':
+    DATABASES['default'].update({
+        'ENGINE': 'billing_system.db_pool.' + DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'SIZE': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'IDLE_TIMEOUT': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'HEALTH_CHECK_AFTER': int(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', 30)),
+        },
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,3 +166,122 @@ CSRF_TRUSTED_ORIGINS = [
     "https://tall-bars-brush.loca.lt",
     "https://*.loca.lt",
 ]
+
+# Images referenced from the PDF templates as `asset:<file name>`, held in
+# memory and downscaled to at most PDF_ASSET_MAX_PX on the longest side
+PDF_ASSETS_DIR = BASE_DIR / 'billing_system' / 'media' / 'images'
+PDF_ASSET_MAX_PX = 400
+
+# Rendered PDF cache (see invoices/pdf_cache.py)
+PDF_CACHE = {
+    'BACKEND': os.environ.get('PDF_CACHE_BACKEND', 'disk'),
+    'LOCATION': os.environ.get('PDF_CACHE_DIR', os.path.join(os.environ.get('TMPDIR', '/tmp'), 'billing_pdf_cache')),
+    'MAX_BYTES': int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    'CACHE_ALIAS': os.environ.get('PDF_CACHE_ALIAS', 'default'),
+}
+
+# Workers for batch PDF renders - bulk exports, the admin download action and
+# rendering.render_many (defaults to the CPU count) - and whether they are
+# processes, threads or "inline" (no pool)
+BULK_EXPORT_WORKERS = int(os.environ.get('BULK_EXPORT_WORKERS', 0)) or None
+PDF_BATCH_POOL = os.environ.get('PDF_BATCH_POOL', 'process')
+
+# Bulk export progress, polled by the list page while a download runs. The
+# poll can reach any worker process, so with more than one this must be a
+# cache they share (e.g. Redis or the database cache), not local memory.
+BULK_EXPORT_PROGRESS = {
+    'CACHE_ALIAS': os.environ.get('BULK_EXPORT_PROGRESS_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('BULK_EXPORT_PROGRESS_TIMEOUT', 60 * 60)),
+}
+
+# Queue PDF renders for `manage.py render_worker` instead of rendering in the
+# request (can also be chosen per request with ?async=1 / ?async=0). The worker
+# hands finished PDFs back through PDF_CACHE, so it must be a store both share.
+PDF_RENDER_ASYNC = os.environ.get('PDF_RENDER_ASYNC', '') == '1'
+
+# Render both PDFs in background threads after an invoice is saved, so the
+# download straight after "Save" is a cache hit (see invoices/prerender.py).
+# Work beyond PDF_PRERENDER_QUEUE waiting invoices is dropped, not queued.
+PDF_PRERENDER = {
+    'ENABLED': os.environ.get('PDF_PRERENDER', '') == '1',
+    'WORKERS': int(os.environ.get('PDF_PRERENDER_WORKERS', 2)),
+    'QUEUE_SIZE': int(os.environ.get('PDF_PRERENDER_QUEUE', 16)),
+}
+
+# Serve PDF and analytics CSV downloads from async views; set when running
+# under ASGI (billing_system/asgi.py). PDFs then render in a pool of
+# ASYNC_PDF_WORKERS processes (defaults to the CPU count).
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '') == '1'
+ASYNC_PDF_WORKERS = int(os.environ.get('ASYNC_PDF_WORKERS', 0)) or None
+
+# Invoices with a longer work description (or ?stream=1) render in one of
+# WORKERS spawned processes capped at MEMORY_LIMIT_MB, into a temp file that is
+# streamed out; PDFs over MAX_PAGES are refused (see invoices/pdf_spool.py)
+PDF_FILE_MODE = {
+    'DESCRIPTION_CHARS': int(os.environ.get('PDF_FILE_MODE_CHARS', 4000)),
+    'MAX_PAGES': int(os.environ.get('PDF_MAX_PAGES', 40)),
+    'MEMORY_LIMIT_MB': int(os.environ.get('PDF_MEMORY_LIMIT_MB', 512)),
+    'SPOOL_MAX_BYTES': int(os.environ.get('PDF_SPOOL_MAX_BYTES', 2 * 1024 * 1024)),
+    'WORKERS': int(os.environ.get('PDF_FILE_MODE_WORKERS', 2)),
+}
+
+# Finalised invoices' PDFs, stored once per SHA-256 (invoices/archive.py).
+# Must be persistent storage. Set INVOICE_ARCHIVE_SENDFILE to "x-accel" or
+# "x-sendfile" when nginx / Apache can serve LOCATION directly.
+INVOICE_ARCHIVE = {
+    'LOCATION': os.environ.get('INVOICE_ARCHIVE_DIR', str(BASE_DIR / 'archive')),
+    'SENDFILE': os.environ.get('INVOICE_ARCHIVE_SENDFILE', ''),
+    'SENDFILE_PREFIX': os.environ.get('INVOICE_ARCHIVE_SENDFILE_PREFIX', '/protected-archive/'),
+}
+
+# In-memory client index behind the create form's autocomplete, one per
+# process. Other processes' writes arrive within SYNC_INTERVAL seconds, their
+# deletes at the next rebuild. Past MAX_CLIENTS the least recent tenth is dropped.
+CLIENT_DIRECTORY = {
+    'MAX_CLIENTS': int(os.environ.get('CLIENT_DIRECTORY_MAX_CLIENTS', '200000')),
+    'MAX_FIELD_CHARS': int(os.environ.get('CLIENT_DIRECTORY_MAX_FIELD_CHARS', '300')),
+    'SYNC_INTERVAL': int(os.environ.get('CLIENT_DIRECTORY_SYNC_INTERVAL', '30')),
+    'REBUILD_INTERVAL': int(os.environ.get('CLIENT_DIRECTORY_REBUILD_INTERVAL', '3600')),
+}
+
+# Shortest word the invoice search sends to the MySQL FULLTEXT index; keep in
+# line with the server's innodb_ft_min_token_size.
+INVOICE_SEARCH_MIN_TOKEN = int(os.environ.get('INVOICE_SEARCH_MIN_TOKEN', '3'))
+
+# "cursor" pages the invoice list by (created_at, id) with an approximate total;
+# "page" restores numbered pages with an exact count.
+INVOICE_LIST_PAGINATION = os.environ.get('INVOICE_LIST_PAGINATION', 'cursor')
+
+# Load PDF templates, images and reportlab at startup. Off on Vercel, where a
+# cold start should not pay for PDF setup unless the request renders one.
+PDF_ASSETS_WARM = os.environ.get('PDF_ASSETS_WARM', '0' if os.environ.get('VERCEL') else '1') == '1'
+
+# Cold-import budget for billing_system.wsgi checked by `profile_imports --budget-ms`
+IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS', 600))
+
+# Request metrics (invoices/metrics.py): /metrics is served to these addresses
+# and to superusers; Server-Timing carries each response's breakdown.
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+
+# Analytics result cache (invoices/analytics_cache.py). Invalidation goes
+# through database counters, so any backend is correct; a shared one (e.g.
+# Redis) also shares the computed results between processes.
+ANALYTICS_CACHE = {
+    'CACHE_ALIAS': os.environ.get('ANALYTICS_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 300)),
+}
+
+# Rendered invoice table partials for the list page's live search
+# (invoices/list_cache.py); keyed on a database version counter like
+# ANALYTICS_CACHE.
+INVOICE_LIST_CACHE = {
+    'CACHE_ALIAS': os.environ.get('INVOICE_LIST_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('INVOICE_LIST_CACHE_TIMEOUT', 300)),
+}
+
+# VAT rates by effective date, (YYYY-MM-DD, rate); see invoices/vat.py.
+# Changing the table only affects invoices saved afterwards.
+VAT_RATES = [
+    ('2018-01-01', '0.05'),
+]
@@ -1,3 +1,61 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
-# Register your models here.
+from .archive import archive_invoices, is_finalised
+from .bulk_export import ExportProgress, iter_rendered, stream_zip
+from .models import Invoice
+
+
+# ================================
+# Invoices
+# ================================
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ("invoice_number", "client_name", "reference_no", "date", "amount", "total_with_vat")
+    list_filter = ("date",)
+    search_fields = ("client_name", "reference_no")
+    date_hierarchy = "date"
+    ordering = ("-created_at", "-id")
+    readonly_fields = ("invoice_number", "vat_amount", "total_with_vat", "created_at", "updated_at")
+    actions = ("download_invoice_pdfs", "download_quotation_pdfs", "finalise_invoices")
+
+    # Finalised invoices are read-only (see archive.InvoiceFinalised).
+    def has_change_permission(self, request, obj=None):
+        if obj is not None and is_finalised(obj):
+            return False
+        return super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and is_finalised(obj):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    @admin.action(description="Download invoice PDFs (ZIP)")
+    def download_invoice_pdfs(self, request, queryset):
+        return self.download_pdfs(queryset, "invoice")
+
+    @admin.action(description="Download quotation PDFs (ZIP)")
+    def download_quotation_pdfs(self, request, queryset):
+        return self.download_pdfs(queryset, "quotation")
+
+    @admin.action(description="Finalise (archive PDFs)")
+    def finalise_invoices(self, request, queryset):
+        counts = archive_invoices(queryset)
+        level = messages.WARNING if counts["failed"] else messages.SUCCESS
+        self.message_user(
+            request,
+            f"Archived {counts['archived']} PDFs ({counts['new_blobs']} new files); {counts['failed']} failed.",
+            level,
+        )
+
+    def download_pdfs(self, queryset, kind):
+        # Same batch renderer as the list page's bulk export.
+        invoices = queryset.order_by("-created_at", "-id")
+        progress = ExportProgress("", invoices.count())
+        response = StreamingHttpResponse(
+            stream_zip(iter_rendered(invoices, kind), kind, progress), content_type="application/zip",
+        )
+        stamp = timezone.now().strftime("%Y%m%d")
+        response["Content-Disposition"] = f'attachment; filename="{kind}s_{stamp}.zip"'
+        return response
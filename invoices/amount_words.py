@@ -0,0 +1,45 @@
+"""
+Amounts in words for the PDFs ("One Hundred Dirhams and Five Fils Only").
+
+``num2words`` and its language registry are imported on first use rather than
+at module load. Words for whole numbers are kept in a bounded LRU cache, which
+covers the Fils part (0-99) and the Dirham amounts an office bills repeatedly.
+Amounts are split into Dirhams and Fils with Decimal arithmetic, after
+rounding to two places the same way the PDF rounds the printed total.
+"""
+
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def integer_words(number):
+    from num2words import num2words
+
+    return num2words(number).replace(',', '')
+
+
+def split_amount(value):
+    """Return ``(negative, dirhams, fils)`` for ``value`` rounded to two places."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    value = round(value, 2)
+    negative = value < 0
+    cents = int(abs(value).scaleb(2))
+    return negative, cents // 100, cents % 100
+
+
+def amount_in_words(value):
+    try:
+        negative, dirhams, fils = split_amount(value)
+    except (InvalidOperation, ValueError, TypeError, OverflowError):
+        return f"{value} AED"
+
+    words = integer_words(dirhams) + " Dirhams"
+    if fils:
+        words += " and " + integer_words(fils) + " Fils"
+    if negative:
+        words = "minus " + words
+    return words + " Only"
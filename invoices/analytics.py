@@ -0,0 +1,286 @@
+"""
+Revenue rollups backing the analytics dashboard and CSV export.
+
+``RevenueRollup`` keeps one row per day and per month, for every client and
+for all clients together. Rows are adjusted incrementally whenever an invoice
+is saved or deleted (see ``signals.py``) and can be rebuilt from scratch with
+``manage.py backfill_rollups``. A date range is answered from whole-month rows
+plus day rows for the partial months at either end, so the number of rows read
+does not grow with the invoice table. The dashboard needs three queries: one
+aggregate for the summary, one over the month rows for the chart (the rollup
+equivalent of grouping invoices by TruncMonth) and one for the top clients.
+
+Every rollup change also invalidates the cached results for its months, in
+the same transaction (``analytics_cache.py``).
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+
+from . import analytics_cache
+from .models import Invoice, RevenueRollup
+
+DAY = RevenueRollup.PERIOD_DAY
+MONTH = RevenueRollup.PERIOD_MONTH
+ALL_CLIENTS = RevenueRollup.ALL_CLIENTS
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def resolve_period(period, date_from, date_to, today):
+    """Date strings for a named period; 'custom' keeps the given ones."""
+    if period == 'this_month':
+        return today.replace(day=1).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+    if period == 'last_month':
+        last_month = today.replace(day=1) - timedelta(days=1)
+        return last_month.replace(day=1).strftime('%Y-%m-%d'), last_month.strftime('%Y-%m-%d')
+    if period == 'last_6_months':
+        return (today.replace(day=1) - timedelta(days=150)).replace(day=1).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+    if period == 'this_year':
+        return today.replace(month=1, day=1).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+    return date_from, date_to
+
+
+# ================================
+# Reading
+# ================================
+def range_q(date_from=None, date_to=None):
+    """Q selecting non-overlapping rollup rows that exactly cover [date_from, date_to]."""
+    months_from = date_from if date_from is None or date_from.day == 1 else next_month(date_from)
+    months_to = None if date_to is None else month_start(date_to + timedelta(days=1))  # exclusive
+
+    if months_from is not None and months_to is not None and months_from >= months_to:
+        # No whole month inside the range.
+        return Q(period=DAY, period_start__gte=date_from, period_start__lte=date_to)
+
+    q = Q(period=MONTH)
+    if months_from is not None:
+        q &= Q(period_start__gte=months_from)
+    if months_to is not None:
+        q &= Q(period_start__lt=months_to)
+    if date_from is not None and months_from > date_from:
+        q |= Q(period=DAY, period_start__gte=date_from, period_start__lt=months_from)
+    if date_to is not None and months_to <= date_to:
+        q |= Q(period=DAY, period_start__gte=months_to, period_start__lte=date_to)
+    return q
+
+
+def revenue_summary(date_from=None, date_to=None):
+    """Revenue, count, average and VAT for a range, from one aggregate query."""
+    totals = RevenueRollup.objects.filter(
+        range_q(date_from, date_to), client_name=ALL_CLIENTS,
+    ).aggregate(amount=Sum('amount'), vat=Sum('vat_amount'), count=Sum('invoice_count'))
+    total_revenue = totals['amount'] or Decimal('0')
+    total_count = totals['count'] or 0
+    # Rollup rows hold sums, so the average is derived rather than Avg()'d.
+    return {
+        'total_revenue': total_revenue,
+        'total_count': total_count,
+        'avg_value': (total_revenue / total_count).quantize(Decimal('0.01')) if total_count > 0 else Decimal('0'),
+        'total_vat': totals['vat'] or Decimal('0'),
+    }
+
+
+def chart_months(today, count=6):
+    """First days of the ``count`` calendar months ending with today's."""
+    months = [month_start(today)]
+    for _ in range(count - 1):
+        months.insert(0, month_start(months[0] - timedelta(days=1)))
+    return months
+
+
+def monthly_revenue(months):
+    """Revenue per month for ``months``, in one grouped query; months without invoices are 0."""
+    amounts = dict(RevenueRollup.objects.filter(
+        period=MONTH, client_name=ALL_CLIENTS, period_start__gte=months[0], period_start__lte=months[-1],
+    ).values_list('period_start', 'amount'))
+    return [{'month': month.strftime('%b %Y'), 'revenue': float(amounts.get(month, 0))} for month in months]
+
+
+def top_clients(date_from=None, date_to=None, limit=5):
+    return RevenueRollup.objects.filter(
+        range_q(date_from, date_to),
+    ).exclude(
+        client_name=ALL_CLIENTS,
+    ).values('client_name').annotate(
+        total=Sum('amount'), count=Sum('invoice_count'),
+    ).filter(count__gt=0).order_by('-total')[:limit]
+
+
+def dashboard(date_from, date_to, today):
+    clients = list(top_clients(date_from, date_to))
+    for client in clients:
+        client['total'] = float(client['total'])
+    return {
+        'summary': revenue_summary(date_from, date_to),
+        'chart': monthly_revenue(chart_months(today)),
+        'top_clients': clients,
+    }
+
+
+# ================================
+# Cached reads (see analytics_cache.py)
+# ================================
+def cached_dashboard(date_from, date_to, today):
+    return analytics_cache.get_or_compute(
+        'dashboard', date_from, date_to,
+        lambda: dashboard(date_from, date_to, today),
+        extra_months=chart_months(today),
+    )
+
+
+def cached_revenue_summary(date_from=None, date_to=None):
+    return analytics_cache.get_or_compute(
+        'summary', date_from, date_to,
+        lambda: revenue_summary(date_from, date_to),
+    )
+
+
+# ================================
+# Incremental maintenance
+# ================================
+def _adjust(period, period_start, client_name, amount, vat_amount, count):
+    rows = RevenueRollup.objects.filter(period=period, period_start=period_start, client_name=client_name)
+    changes = {
+        'amount': F('amount') + amount,
+        'vat_amount': F('vat_amount') + vat_amount,
+        'invoice_count': F('invoice_count') + count,
+    }
+    if rows.update(**changes):
+        if count < 0:
+            rows.filter(invoice_count=0).delete()
+        return
+    if count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            RevenueRollup.objects.create(
+                period=period, period_start=period_start, client_name=client_name,
+                amount=amount, vat_amount=vat_amount, invoice_count=count,
+            )
+    except IntegrityError:
+        # Created concurrently; fold this change into that row instead.
+        rows.update(**changes)
+
+
+def _new_deltas():
+    return defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+
+
+def _add_deltas(deltas, invoice_date, client_name, amount, vat_amount, sign):
+    invoice_date = to_date(invoice_date)
+    amount, vat_amount = Decimal(str(amount)), Decimal(str(vat_amount))
+    for period, period_start in ((DAY, invoice_date), (MONTH, month_start(invoice_date))):
+        for client in (ALL_CLIENTS, client_name):
+            delta = deltas[(period, period_start, client)]
+            delta[0] += amount * sign
+            delta[1] += vat_amount * sign
+            delta[2] += sign
+
+
+def _apply_deltas(deltas):
+    # Every writer takes the rollup rows in the same (sorted) order, so two
+    # concurrent writes touching the same rows cannot deadlock on them.
+    with transaction.atomic():
+        for key in sorted(deltas):
+            if any(deltas[key]):
+                _adjust(*key, *deltas[key])
+        analytics_cache.invalidate({period_start for (period, period_start, _client) in deltas if period == DAY})
+
+
+def apply_invoice(invoice_date, client_name, amount, vat_amount, sign=1):
+    deltas = _new_deltas()
+    _add_deltas(deltas, invoice_date, client_name, amount, vat_amount, sign)
+    _apply_deltas(deltas)
+
+
+def apply_change(previous, current):
+    """Move an edited invoice from its ``previous`` to its ``current`` rollup_state() in one pass."""
+    deltas = _new_deltas()
+    _add_deltas(deltas, *previous, sign=-1)
+    _add_deltas(deltas, *current, sign=1)
+    _apply_deltas(deltas)
+
+
+def apply_invoices(invoices, sign=1):
+    # Bulk writes skip model signals; fold a whole batch into one adjustment per row.
+    deltas = _new_deltas()
+    for invoice in invoices:
+        _add_deltas(deltas, *rollup_state(invoice), sign=sign)
+    _apply_deltas(deltas)
+
+
+def rollup_state(invoice):
+    return (
+        to_date(invoice.date), invoice.client_name,
+        Decimal(str(invoice.amount)), Decimal(str(invoice.vat_amount)),
+    )
+
+
+# ================================
+# Full rebuild
+# ================================
+def _grouped(period, by_client):
+    qs = Invoice.objects.all()
+    fields = []
+    if period == MONTH:
+        qs = qs.annotate(bucket=TruncMonth('date'))
+    else:
+        qs = qs.annotate(bucket=F('date'))
+    fields.append('bucket')
+    if by_client:
+        fields.append('client_name')
+    rows = qs.values(*fields).annotate(amount=Sum('amount'), vat=Sum('vat_amount'), count=Count('id')).order_by()
+    for row in rows.iterator():
+        bucket = row['bucket']
+        if hasattr(bucket, 'date'):
+            bucket = bucket.date()
+        yield RevenueRollup(
+            period=period,
+            period_start=bucket,
+            client_name=row.get('client_name', ALL_CLIENTS),
+            amount=row['amount'],
+            vat_amount=row['vat'],
+            invoice_count=row['count'],
+        )
+
+
+def rebuild(batch_size=1000):
+    created = 0
+    with transaction.atomic():
+        RevenueRollup.objects.all().delete()
+        for period in (DAY, MONTH):
+            for by_client in (False, True):
+                batch = []
+                for rollup in _grouped(period, by_client):
+                    batch.append(rollup)
+                    if len(batch) >= batch_size:
+                        RevenueRollup.objects.bulk_create(batch)
+                        created += len(batch)
+                        batch = []
+                if batch:
+                    RevenueRollup.objects.bulk_create(batch)
+                    created += len(batch)
+        analytics_cache.invalidate_all()
+    return created
@@ -0,0 +1,114 @@
+"""
+Result cache for analytics reads.
+
+An entry is keyed by what it covers: its date range (plus any extra months it
+reads, such as the dashboard's six-month chart) mapped to per-month generation
+counters. Saving or deleting an invoice bumps only the counter for its month,
+so cached results for other ranges stay valid and affected ones are never read
+again (they simply expire). Open-ended or very long ranges depend on a single
+"all" counter that every write bumps, and a full rollup rebuild bumps an epoch
+shared by every entry.
+
+The counters are database rows (``generations.py``) bumped in the same
+transaction as the rollup change, so an invalidation reaches every process
+when it commits, even with a process-local cache; reading them costs one
+query per lookup.
+
+On a miss only the caller that wins ``cache.add`` on a short-lived lock key
+computes the result; concurrent callers poll for it for up to ``LOCK_WAIT``
+seconds before computing themselves.
+"""
+
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import generations
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+ALL = "all"
+EPOCH = "epoch"
+MAX_TRACKED_MONTHS = 36
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 10
+POLL_INTERVAL = 0.05
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "ANALYTICS_CACHE", {})}
+
+
+def _cache():
+    return caches[_config()["CACHE_ALIAS"]]
+
+
+def _generation_name(scope):
+    return f"analytics:{scope}"
+
+
+def _month_scope(day):
+    return day.strftime("%Y-%m")
+
+
+def _months(date_from, date_to):
+    month = date_from.replace(day=1)
+    while month <= date_to:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def scopes(date_from, date_to, extra_months=()):
+    """Generation counters an entry over [date_from, date_to] depends on."""
+    if date_from is None or date_to is None:
+        return [EPOCH, ALL]
+    months = {_month_scope(month) for month in _months(date_from, date_to)}
+    months.update(_month_scope(month) for month in extra_months)
+    if len(months) > MAX_TRACKED_MONTHS:
+        return [EPOCH, ALL]
+    return [EPOCH] + sorted(months)
+
+
+def get_or_compute(kind, date_from, date_to, compute, extra_months=()):
+    cache = _cache()
+    scope_list = scopes(date_from, date_to, extra_months)
+    counters = generations.current([_generation_name(scope) for scope in scope_list])
+    descriptor = f"{kind}|{date_from}|{date_to}|{','.join(scope_list)}|{','.join(map(str, counters))}"
+    key = f"analytics:{kind}:{hashlib.sha1(descriptor.encode()).hexdigest()}"
+
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, _config()["TIMEOUT"])
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+def invalidate(dates):
+    """Invalidate cached results covering any of ``dates``; call inside the write's transaction."""
+    months = {_month_scope(day) for day in dates if day is not None}
+    generations.bump(*(_generation_name(scope) for scope in months | {ALL}))
+
+
+def invalidate_all():
+    generations.bump(_generation_name(EPOCH))
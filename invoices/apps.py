@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class InvoicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoices'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+
+        if getattr(settings, 'PDF_ASSETS_WARM', True):
+            from .pdf_assets import warm
+
+            warm()
@@ -0,0 +1,199 @@
+"""
+Archive of finalised invoice PDFs.
+
+Finalising an invoice renders its invoice and quotation PDFs once and freezes
+them: later downloads serve the archived file, so a template change never
+alters a document that was already issued. PDFs live in a content-addressed
+blob store under ``settings.INVOICE_ARCHIVE["LOCATION"]``, one file per
+SHA-256, sharded as ``ab/cd/<digest>.pdf``. Identical PDFs are stored once.
+Rendering is deterministic (see ``pdf_assets``), so re-rendering an unchanged
+invoice produces the same blob. ``ArchivedPDF`` rows map (invoice, kind) to a
+digest and are never rewritten.
+
+A finalised invoice is locked: saving or deleting it raises
+``InvoiceFinalised`` (see signals.py), so its figures cannot drift from the
+archived documents.
+
+Downloads are ``FileResponse``s over the blob, which WSGI servers send with
+``sendfile``. With ``SENDFILE`` set to ``"x-accel"`` (nginx) or
+``"x-sendfile"`` (Apache), the web server reads the file itself instead.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse
+
+from .models import ArchivedPDF, Invoice
+from .rendering import TEMPLATES, iter_render
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "LOCATION": Path(settings.BASE_DIR) / "archive",
+    "SENDFILE": "",
+    "SENDFILE_PREFIX": "/protected-archive/",
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "INVOICE_ARCHIVE", {})}
+
+
+class InvoiceFinalised(PermissionDenied):
+    """A finalised invoice was saved or deleted; views turn this into a 403."""
+
+
+class BlobStore:
+    def __init__(self, location):
+        self.location = Path(location)
+
+    def path(self, digest):
+        return self.location / digest[:2] / digest[2:4] / f"{digest}.pdf"
+
+    def relative_path(self, digest):
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+
+    def put(self, data):
+        """Store ``data``; returns ``(digest, created)``."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.chmod(tmp, 0o444)
+            # A concurrent writer of the same digest wrote the same bytes.
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        return digest, True
+
+    def open(self, digest):
+        return open(self.path(digest), "rb")
+
+    def digests(self):
+        for path in self.location.glob("*/*/*.pdf"):
+            yield path.stem
+
+
+def get_store():
+    return BlobStore(config()["LOCATION"])
+
+
+# ================================
+# Archiving
+# ================================
+def record(invoice, kind, pdf, store=None):
+    """Store ``pdf`` and point (invoice, kind) at it, unless already archived.
+
+    Returns ``(ArchivedPDF, blob_created)``.
+    """
+    store = store or get_store()
+    digest, created = store.put(pdf)
+    try:
+        with transaction.atomic():
+            archived, _ = ArchivedPDF.objects.get_or_create(
+                invoice=invoice, kind=kind, defaults={"sha256": digest, "size": len(pdf)},
+            )
+    except IntegrityError:
+        # Archived concurrently; the first record stands.
+        archived = ArchivedPDF.objects.get(invoice=invoice, kind=kind)
+    return archived, created
+
+
+def unarchived(kind, queryset=None):
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    return queryset.exclude(archived_pdfs__kind=kind)
+
+
+def archive_invoices(queryset, kinds=None, pool=None, workers=None, on_done=None):
+    """Render and archive every invoice in ``queryset`` that is not archived yet.
+
+    Renders go through ``rendering.iter_render``, which is a process pool by
+    default. Returns counts: ``archived``, ``new_blobs`` and ``failed``.
+    """
+    store = get_store()
+    counts = {"archived": 0, "new_blobs": 0, "failed": 0}
+    for kind in kinds or TEMPLATES:
+        pending = unarchived(kind, queryset).order_by("pk")
+        for invoice, pdf in iter_render(pending.iterator(chunk_size=200), kind, pool, workers):
+            if pdf is None:
+                counts["failed"] += 1
+            else:
+                _archived, created = record(invoice, kind, pdf, store)
+                counts["archived"] += 1
+                counts["new_blobs"] += created
+            if on_done:
+                on_done(kind, invoice, pdf is not None)
+    return counts
+
+
+def finalise(invoice):
+    """Archive both PDFs of one invoice, rendered in this process."""
+    return archive_invoices(Invoice.objects.filter(pk=invoice.pk), pool="inline")
+
+
+def find_archived(invoice, kind):
+    """The archived PDF to serve for (invoice, kind), if any."""
+    archived = ArchivedPDF.objects.filter(invoice=invoice, kind=kind).first()
+    if archived is not None and not get_store().path(archived.sha256).exists():
+        # Lost storage should not break downloads; serve a fresh render.
+        logger.error("Archived %s PDF of invoice %s is missing blob %s", kind, invoice.pk, archived.sha256)
+        return None
+    return archived
+
+
+def archived_digests(invoices, kind):
+    """``{pk: sha256}`` for the ``invoices`` with an archived ``kind`` PDF, in one query."""
+    store = get_store()
+    rows = ArchivedPDF.objects.filter(invoice__in=[invoice.pk for invoice in invoices], kind=kind)
+    digests = {}
+    for pk, digest in rows.values_list("invoice_id", "sha256"):
+        if store.path(digest).exists():
+            digests[pk] = digest
+        else:
+            logger.error("Archived %s PDF of invoice %s is missing blob %s", kind, pk, digest)
+    return digests
+
+
+def is_finalised(invoice):
+    return ArchivedPDF.objects.filter(invoice=invoice).exists()
+
+
+def check_editable(invoice):
+    if invoice.pk is not None and is_finalised(invoice):
+        raise InvoiceFinalised(f"Invoice {invoice.pk} is finalised; its PDFs are archived and it can no longer change.")
+
+
+# ================================
+# Downloads
+# ================================
+def archived_response(archived, filename):
+    options = config()
+    store = get_store()
+    if options["SENDFILE"] == "x-accel":
+        response = HttpResponse(content_type="application/pdf")
+        response["X-Accel-Redirect"] = options["SENDFILE_PREFIX"] + store.relative_path(archived.sha256)
+    elif options["SENDFILE"] == "x-sendfile":
+        response = HttpResponse(content_type="application/pdf")
+        response["X-Sendfile"] = str(store.path(archived.sha256))
+    else:
+        response = FileResponse(store.open(archived.sha256), content_type="application/pdf")
+    response["Content-Disposition"] = f'filename="{filename}"'
+    return response
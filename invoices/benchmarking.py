@@ -0,0 +1,164 @@
+"""
+Helpers shared by the ``bench_*`` management commands: synthetic invoice
+seeding, a throwaway superuser for test-client requests, and latency
+summaries.
+
+Seeding is meant for a stand-in database (``DB_ENGINE=sqlite``, or a scratch
+MySQL database via ``DB_NAME``): seeded invoices take real numbers from the
+invoice sequence, so the commands refuse any other database unless given
+``--i-know``.
+"""
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from . import list_cache, vat
+from .analytics import rebuild
+from .models import ArchivedPDF, Invoice, RenderJob
+from .numbering import reserve
+
+SEED_SUBJECT = 'Benchmark seed'
+BENCH_USER = 'bench-admin'
+STAND_IN_VENDORS = ('sqlite',)
+
+CLIENT_WORDS = [
+    'Al', 'Noor', 'Emirates', 'Gulf', 'Falcon', 'Desert', 'Pearl', 'Oasis', 'Crescent', 'Marina',
+    'Summit', 'Horizon', 'Atlas', 'Delta', 'Nova', 'Zenith', 'Golden', 'Silver', 'Royal', 'Coastal',
+]
+CLIENT_SUFFIXES = ['Trading LLC', 'General Contracting', 'Technical Services', 'Holdings', 'FZE', 'Facilities Management']
+
+
+def client_names(count=2000, seed=1):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_SUFFIXES)}")
+    return sorted(names)
+
+
+def add_seed_arguments(parser):
+    parser.add_argument(
+        "--i-know", action="store_true",
+        help="Seed a non-sqlite database anyway. Seeded invoices use up real invoice numbers; "
+             "point DB_NAME at a scratch database.",
+    )
+
+
+def check_seed_database(i_know=False):
+    if connection.vendor in STAND_IN_VENDORS or i_know:
+        return
+    raise CommandError(
+        f"Refusing to seed benchmark invoices into the {connection.vendor} database "
+        f"{connection.settings_dict['NAME']!r}. Run with DB_ENGINE=sqlite, or point DB_NAME at a scratch "
+        f"database and pass --i-know."
+    )
+
+
+@contextmanager
+def bench_superuser():
+    """A superuser for test-client requests, deleted afterwards unless it already existed."""
+    user, created = get_user_model().objects.get_or_create(
+        username=BENCH_USER, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save()
+    try:
+        yield user
+    finally:
+        if created:
+            user.delete()
+
+
+def seed_invoices(total, batch_size=5000, days=3 * 365, seed=1, stdout=None):
+    """Top the table up to ``total`` invoices with synthetic rows; returns how many were added."""
+    existing = Invoice.objects.count()
+    missing = max(0, total - existing)
+    if not missing:
+        return 0
+
+    rng = random.Random(seed + existing)
+    clients = client_names(seed=seed)
+    today = date.today()
+    added = 0
+    while added < missing:
+        count = min(batch_size, missing - added)
+        numbers = reserve(count)
+        batch = []
+        for number in numbers:
+            batch.append(vat.apply(Invoice(
+                invoice_number=number,
+                client_name=rng.choice(clients),
+                reference_no=f"REF-{rng.randint(2020, 2026)}-{rng.randint(1, 99999):05d}",
+                date=today - timedelta(days=rng.randrange(days)),
+                subject=SEED_SUBJECT,
+                address='Dubai, UAE',
+                mobile_number=f"05{rng.randint(0, 99999999):08d}",
+                amount=Decimal(rng.randint(10000, 5000000)) / 100,
+                work_description='Synthetic invoice for benchmarking.',
+            )))
+        with transaction.atomic():
+            Invoice.objects.bulk_create(batch)
+        added += count
+        if stdout:
+            stdout.write(f"  seeded {existing + added}/{total}")
+
+    # bulk_create skips the rollup and list cache signals.
+    rebuild()
+    list_cache.bump_version()
+    return added
+
+
+def clear_seeded():
+    # Raw deletes: no per-row signals or collector. The rollups are rebuilt
+    # and the list version bumped once instead.
+    with transaction.atomic():
+        for model in (RenderJob, ArchivedPDF):
+            model.objects.filter(invoice__subject=SEED_SUBJECT)._raw_delete(model.objects.db)
+        seeded = Invoice.objects.filter(subject=SEED_SUBJECT)
+        deleted = seeded._raw_delete(seeded.db)
+        list_cache.bump_version()
+        rebuild()
+    return deleted
+
+
+def measure(func, iterations, warmup=1):
+    """Call ``func`` and return the sorted wall-clock timings in milliseconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(timings):
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+    }
+
+
+def format_summary(summary):
+    return (
+        f"mean {summary['mean_ms']:.1f} ms, p50 {summary['p50_ms']:.1f} ms, "
+        f"p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms"
+    )
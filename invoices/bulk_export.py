@@ -0,0 +1,249 @@
+"""
+Bulk export of invoice / quotation PDFs.
+
+Matching invoices are rendered through ``rendering.iter_render`` (a process
+pool with only a small window of documents in flight), and each finished PDF
+is handed to the response as soon as it is ready: appended to a ZIP stream, or
+copied object by object into one merged PDF (``MergedPDFStream``). Only the
+document being copied is held in memory; what is kept for the whole export is
+one offset per written object and one object number per page.
+
+Progress is published under the client-supplied token so the page can poll
+it while the download runs. The poll may reach any worker process, so the
+cache (``BULK_EXPORT_PROGRESS["CACHE_ALIAS"]``) must be one they all share.
+An export that raises or is abandoned by the client ends as "failed".
+"""
+
+import zipfile
+from array import array
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .rendering import iter_render
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 60 * 60,
+}
+# Page references / cross-reference entries written per output chunk.
+XREF_BLOCK = 1000
+
+
+# ================================
+# Progress tracking
+# ================================
+def _config():
+    return {**DEFAULTS, **getattr(settings, "BULK_EXPORT_PROGRESS", {})}
+
+
+def _cache():
+    return caches[_config()["CACHE_ALIAS"]]
+
+
+class ExportProgress:
+    """Progress of one export; use as a context manager around the stream."""
+
+    def __init__(self, token, total):
+        self.key = f"bulk-export:{token}" if token else None
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.state = "running"
+        self._publish()
+
+    def _publish(self):
+        if self.key:
+            _cache().set(self.key, {
+                "state": self.state,
+                "total": self.total,
+                "done": self.done,
+                "failed": self.failed,
+            }, _config()["TIMEOUT"])
+
+    def advance(self, ok=True):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        self._publish()
+
+    def finish(self):
+        self.state = "done"
+        self._publish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # The stream raised, or was closed by the client before the end.
+        if self.state != "done":
+            self.state = "failed"
+            self._publish()
+
+
+def get_progress(token):
+    return _cache().get(f"bulk-export:{token}")
+
+
+# ================================
+# Rendering
+# ================================
+def iter_rendered(invoices, kind):
+    """Yield ``(invoice, pdf_bytes)`` in queryset order; ``pdf_bytes`` is None on failure."""
+    return iter_render(invoices.iterator(chunk_size=200), kind)
+
+
+# ================================
+# Output formats
+# ================================
+class _StreamBuffer:
+    # Write-only sink; zipfile falls back to data descriptors when it cannot seek.
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(rendered, kind, progress):
+    buffer = _StreamBuffer()
+    with progress:
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for invoice, pdf in rendered:
+                name = f"{kind}_{invoice.invoice_number or invoice.pk}"
+                if pdf is None:
+                    archive.writestr(f"{name}.error.txt", "PDF generation error")
+                else:
+                    archive.writestr(f"{name}.pdf", pdf)
+                progress.advance(pdf is not None)
+                yield buffer.drain()
+        progress.finish()
+    yield buffer.drain()
+
+
+class MergedPDFStream:
+    """Writes one PDF from many, a document at a time.
+
+    Each document's pages and the objects they reference are renumbered and
+    written out as soon as the document is appended, so the caller can drain
+    the output after every document; ``close()`` then yields the page tree,
+    catalogue and cross-reference table.
+    """
+
+    def __init__(self):
+        self._buffer = _StreamBuffer()
+        self._position = 0
+        self._offsets = array("q", [0])  # byte offset of each object, by number
+        self._page_numbers = array("q")
+        self._pages_number = self._allocate()
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _allocate(self):
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _write(self, data):
+        self._position += self._buffer.write(data)
+
+    def _write_object(self, number, obj):
+        self._offsets[number] = self._position
+        self._write(f"{number} 0 obj\n".encode())
+        stream = BytesIO()
+        obj.write_to_stream(stream, None)
+        self._write(stream.getvalue())
+        self._write(b"\nendobj\n")
+
+    def append(self, pdf):
+        from pypdf import PdfReader
+
+        with PdfReader(BytesIO(pdf)) as reader:
+            # Closing the reader drops its object cache, which refers back to
+            # the reader; left to the garbage collector, those cycles pile up.
+            self._copy(reader)
+
+    def _copy(self, reader):
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        numbers = {}  # (idnum, generation) in this document -> object number in the output
+        pending = []
+
+        def renumber(obj):
+            # Points the references inside ``obj`` at output object numbers, queueing the targets.
+            items = obj.items() if isinstance(obj, DictionaryObject) else enumerate(obj)
+            for key, value in list(items):
+                if isinstance(value, IndirectObject):
+                    if value.pdf is not reader:
+                        continue  # already renumbered (a shared object reached twice)
+                    source = (value.idnum, value.generation)
+                    if source not in numbers:
+                        numbers[source] = self._allocate()
+                        pending.append(value)
+                    obj[key] = IndirectObject(numbers[source], 0, None)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    renumber(value)
+
+        pages = []
+        for page in reader.pages:
+            # Pages come flattened, with inherited attributes copied onto them.
+            number = self._allocate()
+            numbers[(page.indirect_reference.idnum, page.indirect_reference.generation)] = number
+            page[NameObject("/Parent")] = IndirectObject(self._pages_number, 0, None)
+            pages.append((number, page))
+        for number, page in pages:
+            renumber(page)
+            self._write_object(number, page)
+            self._page_numbers.append(number)
+        while pending:
+            reference = pending.pop()
+            obj = reference.get_object()
+            if isinstance(obj, (DictionaryObject, ArrayObject)):
+                renumber(obj)
+            self._write_object(numbers[(reference.idnum, reference.generation)], obj)
+
+    def close(self):
+        """Write the page tree, catalogue and cross-reference table, yielding the output in blocks."""
+        self._offsets[self._pages_number] = self._position
+        self._write(f"{self._pages_number} 0 obj\n<< /Type /Pages /Kids [".encode())
+        for start in range(0, len(self._page_numbers), XREF_BLOCK):
+            block = self._page_numbers[start:start + XREF_BLOCK]
+            self._write("".join(f"{number} 0 R " for number in block).encode())
+            yield self.drain()
+        self._write(f"] /Count {len(self._page_numbers)} >>\nendobj\n".encode())
+        catalog = self._allocate()
+        self._offsets[catalog] = self._position
+        self._write(f"{catalog} 0 obj\n<< /Type /Catalog /Pages {self._pages_number} 0 R >>\nendobj\n".encode())
+
+        xref = self._position
+        size = len(self._offsets)
+        self._write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for start in range(1, size, XREF_BLOCK):
+            block = self._offsets[start:start + XREF_BLOCK]
+            self._write("".join(f"{offset:010d} 00000 n \n" for offset in block).encode())
+            yield self.drain()
+        self._write(f"trailer\n<< /Size {size} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        yield self.drain()
+
+    def drain(self):
+        return self._buffer.drain()
+
+
+def stream_merged_pdf(rendered, progress):
+    merged = MergedPDFStream()
+    with progress:
+        for invoice, pdf in rendered:
+            if pdf is not None:
+                merged.append(pdf)
+            progress.advance(pdf is not None)
+            yield merged.drain()
+        progress.finish()
+    yield from merged.close()
@@ -0,0 +1,205 @@
+"""
+In-process client directory behind the invoice form's client autocomplete.
+
+Holds one entry per distinct client name, with the address and mobile number
+of that client's latest invoice, and a sorted array of case-folded names, so
+a prefix lookup is one ``bisect`` plus a short scan. It is built lazily on
+the first lookup from one grouped query. After that it is updated:
+
+* on ``Invoice`` saves and deletes in this process (see signals.py), and
+* by a delta query for rows changed since the last sync, at most every
+  ``SYNC_INTERVAL`` seconds, for writes made by other processes.
+
+Deletes in other processes only show up at the next full rebuild, every
+``REBUILD_INTERVAL`` seconds. At most ``MAX_CLIENTS`` clients are kept.
+Past that, the least recently invoiced tenth is dropped. Stored addresses
+are cut to ``MAX_FIELD_CHARS``.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Invoice
+
+DEFAULTS = {
+    "MAX_CLIENTS": 200_000,
+    "MAX_FIELD_CHARS": 300,
+    "SYNC_INTERVAL": 30,
+    "REBUILD_INTERVAL": 3600,
+}
+
+FIELDS = ("pk", "client_name", "address", "mobile_number")
+FETCH_CHUNK = 2000
+# Re-read a little before the last sync, for clock skew between app servers;
+# applying a row twice is harmless.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "CLIENT_DIRECTORY", {})}
+
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+class ClientDirectory:
+    def __init__(self, max_clients, max_field_chars, sync_interval, rebuild_interval):
+        self.max_clients = max_clients
+        self.max_field_chars = max_field_chars
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.RLock()
+        self._keys = []       # sorted normalized names
+        self._entries = {}    # normalized name -> (latest pk, name, address, mobile number)
+        self._built_at = None
+        self._synced_at = None  # monotonic time of the last sync
+        self._synced_from = None  # database time the next delta query starts at
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def built(self):
+        return self._built_at is not None
+
+    # ================================
+    # Loading
+    # ================================
+    def build(self):
+        started = timezone.now()
+        latest = (
+            Invoice.objects.exclude(client_name="")
+            .values("client_name")
+            .annotate(last_pk=Max("pk"))
+            .order_by("-last_pk")
+            .values_list("last_pk", flat=True)[:self.max_clients]
+        )
+        pks = list(latest)
+        entries = {}
+        for start in range(0, len(pks), FETCH_CHUNK):
+            rows = Invoice.objects.filter(pk__in=pks[start:start + FETCH_CHUNK]).values_list(*FIELDS)
+            for row in rows:
+                self._put(entries, row)
+        with self._lock:
+            self._entries = entries
+            self._keys = sorted(entries)
+            self._built_at = self._synced_at = time.monotonic()
+            self._synced_from = started
+
+    def sync(self):
+        """Apply invoices written since the last sync (by any process)."""
+        started = timezone.now()
+        rows = Invoice.objects.filter(updated_at__gte=self._synced_from - SYNC_OVERLAP).order_by("pk").values_list(*FIELDS)
+        for row in rows:
+            self.add(row)
+        with self._lock:
+            self._synced_at = time.monotonic()
+            self._synced_from = started
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > self.rebuild_interval:
+            self.build()
+        elif now - self._synced_at > self.sync_interval:
+            self.sync()
+
+    # ================================
+    # Updates
+    # ================================
+    def _put(self, entries, row):
+        pk, name, address, mobile_number = row
+        key = normalize(name or "")
+        if not key:
+            return None
+        current = entries.get(key)
+        if current is not None and current[0] > pk:
+            return None  # an older invoice; the latest one's details stand
+        entries[key] = (pk, name.strip(), (address or "")[:self.max_field_chars], mobile_number or "")
+        return current is None
+
+    def add(self, row):
+        with self._lock:
+            added = self._put(self._entries, row)
+            if added:
+                insort(self._keys, normalize(row[1]))
+                if len(self._keys) > self.max_clients:
+                    self._evict()
+
+    def add_invoice(self, invoice):
+        if self.built:
+            self.add(tuple(getattr(invoice, field) for field in FIELDS))
+
+    def remove_invoice(self, pk, client_name):
+        """Forget deleted invoice ``pk``; its client falls back to their previous one, if any."""
+        if not self.built:
+            return
+        key = normalize(client_name or "")
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or current[0] != pk:
+                return
+            del self._entries[key]
+            del self._keys[bisect_left(self._keys, key)]
+        previous = (
+            Invoice.objects.filter(client_name=client_name).exclude(pk=pk)
+            .order_by("-pk").values_list(*FIELDS).first()
+        )
+        if previous is not None:
+            self.add(previous)
+
+    def _evict(self):
+        # Drop the least recently invoiced tenth in one pass rather than one
+        # client per insert.
+        keep = sorted(self._entries.items(), key=lambda item: item[1][0], reverse=True)
+        keep = keep[:self.max_clients - max(1, self.max_clients // 10)]
+        self._entries = dict(keep)
+        self._keys = sorted(self._entries)
+
+    # ================================
+    # Lookup
+    # ================================
+    def search(self, prefix, limit=10):
+        key = normalize(prefix)
+        if not key:
+            return []
+        results = []
+        with self._lock:
+            keys = self._keys
+            index = bisect_left(keys, key)
+            while index < len(keys) and len(results) < limit and keys[index].startswith(key):
+                _pk, name, address, mobile_number = self._entries[keys[index]]
+                results.append({"name": name, "address": address, "mobile_number": mobile_number})
+                index += 1
+        return results
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_directory():
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                options = config()
+                _directory = ClientDirectory(
+                    options["MAX_CLIENTS"], options["MAX_FIELD_CHARS"],
+                    options["SYNC_INTERVAL"], options["REBUILD_INTERVAL"],
+                )
+    return _directory
+
+
+def search_clients(prefix, limit=10):
+    directory = get_directory()
+    with _directory_lock:
+        # One caller builds or syncs; the others wait instead of repeating it.
+        directory.refresh()
+    return directory.search(prefix, limit)
@@ -0,0 +1,119 @@
+"""
+Streaming CSV export for the analytics page.
+
+Detail rows are read in keyset-paginated chunks ordered by (date, id) and
+selecting only the exported columns. The MySQL drivers buffer a whole result
+set client-side even under ``.iterator()``, so chunking by key is what keeps
+memory flat; each chunk is written to the response as soon as it is read.
+"""
+
+import csv
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import cached_revenue_summary
+from .models import Invoice
+
+CHUNK_SIZE = 2000
+DETAIL_FIELDS = ('id', 'date', 'invoice_number', 'client_name', 'reference_no', 'amount', 'vat_amount', 'total_with_vat')
+
+
+class Echo:
+    # csv.writer target that hands each formatted row straight back.
+    def write(self, value):
+        return value
+
+
+def iter_invoice_rows(date_from=None, date_to=None, chunk_size=CHUNK_SIZE):
+    qs = Invoice.objects.all()
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    qs = qs.order_by('-date', '-id').values_list(*DETAIL_FIELDS)
+
+    last = None
+    while True:
+        chunk = qs
+        if last is not None:
+            chunk = qs.filter(Q(date__lt=last[1]) | Q(date=last[1], id__lt=last[0]))
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def analytics_csv_rows(period, date_from_raw, date_to_raw, date_from, date_to):
+    yield ['BUSINESS ANALYTICS SUMMARY']
+    yield ['Generated At', timezone.now().strftime('%Y-%m-%d %H:%M:%S')]
+    if date_from_raw or date_to_raw:
+        yield ['Filters', f'Period: {period} | From: {date_from_raw or "All"} | To: {date_to_raw or "All"}']
+    yield []
+
+    # Same summary figures as the dashboard, from one aggregate over the rollups.
+    summary = cached_revenue_summary(date_from, date_to)
+
+    yield ['Metric', 'Value']
+    yield ['Total Revenue (AED)', f"{summary['total_revenue']:.2f}"]
+    yield ['Total VAT Collected (AED)', f"{summary['total_vat']:.2f}"]
+    yield ['Total Quotations', summary['total_count']]
+    yield ['Average Value (AED)', f"{summary['avg_value']:.2f}"]
+    yield []
+
+    # Detailed Data
+    yield ['DETAILED INVOICE DATA']
+    yield ['Date', 'Invoice No', 'Client Name', 'Reference', 'Amount (AED)', 'VAT (AED)', 'Total (AED)']
+
+    # VAT and totals are stored per invoice, so rows are written as read.
+    for rows in iter_invoice_rows(date_from, date_to):
+        for _id, date, invoice_number, client_name, reference_no, amount, vat_amount, total_with_vat in rows:
+            yield [
+                date.strftime('%d/%m/%Y'),
+                invoice_number,
+                client_name,
+                reference_no,
+                f"{amount:.2f}",
+                f"{vat_amount:.2f}",
+                f"{total_with_vat:.2f}",
+            ]
+
+
+def stream_csv(rows, batch_size=500):
+    writer = csv.writer(Echo())
+    # BOM for Excel compatibility
+    buffer = ['\ufeff']
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def async_chunks(chunks):
+    """Serve a sync chunk iterator from async code, one thread hop per chunk.
+
+    Each step runs in the request's sync thread, so the detail queries keep
+    using one connection and the event loop is free between chunks.
+    """
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,52 @@
+"""
+Cache generation counters kept in the database.
+
+Cached results (``list_cache``, ``analytics_cache``) are keyed on one or more
+named counters, and every write that changes the underlying data bumps its
+counters in the same transaction. Because the counters are rows rather than
+cache entries, a bump is seen by every process as soon as the write commits,
+whatever cache backend holds the results: a process-local cache can keep a
+stale entry, but never serves it again.
+
+A counter is created from the clock rather than from zero, so a recreated row
+never comes back with a value an old entry was stored under.
+
+A bump locks its rows until the transaction ends. One ``bump`` call takes its
+rows in sorted order, but a transaction that bumps in several calls must keep
+the order every other writer uses, or two of them can deadlock. Invoice writes
+bump the invoice table counter first, then adjust the revenue rollups and
+bump the analytics counters (signals.py, the importer).
+"""
+
+import time
+
+from django.db.models import F
+
+from .models import CacheGeneration
+
+
+def _create(names):
+    # A counter created concurrently keeps its value.
+    seed = time.time_ns()
+    CacheGeneration.objects.bulk_create(
+        [CacheGeneration(name=name, value=seed) for name in names], ignore_conflicts=True,
+    )
+
+
+def current(names):
+    """Values of the counters in ``names``, in order; one query once they exist."""
+    values = dict(CacheGeneration.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = [name for name in names if name not in values]
+    if missing:
+        _create(missing)
+        values.update(CacheGeneration.objects.filter(name__in=missing).values_list('name', 'value'))
+    return [values[name] for name in names]
+
+
+def bump(*names):
+    # One UPDATE for all of them, locking the rows in index order; see the
+    # module docstring for the order across calls.
+    names = sorted(set(names))
+    if CacheGeneration.objects.filter(name__in=names).update(value=F('value') + 1) < len(names):
+        # A missing counter has no entries keyed on it yet; creating it is enough.
+        _create(names)
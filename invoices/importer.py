@@ -0,0 +1,181 @@
+"""
+Bulk invoice import from CSV or JSON Lines.
+
+Rows are parsed one at a time from the source stream and validated with
+``InvoiceForm``, so an import enforces the same rules as the create page.
+Every ``batch_size`` valid rows get their invoice numbers reserved in a single
+statement and are written with one ``bulk_create`` inside a transaction,
+together with the matching revenue rollup adjustments (bulk writes skip the
+model signals). Invalid rows are reported by line number and do not stop the
+import. Files must be UTF-8; one that is not is rejected, with the line of the
+first bad byte, before anything is written.
+"""
+
+import codecs
+import csv
+import io
+import json
+import time
+
+from django.db import IntegrityError, transaction
+
+from . import list_cache, vat
+from .analytics import apply_invoices
+from .forms import InvoiceForm
+from .models import Invoice
+from .numbering import reserve, resync
+
+DEFAULT_BATCH_SIZE = 500
+# utf-8-sig also strips an Excel BOM.
+ENCODING = 'utf-8-sig'
+CHECK_CHUNK_SIZE = 64 * 1024
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return (self.created + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': [{'line': line, 'errors': errors} for line, errors in self.errors],
+        }
+
+
+# ================================
+# Parsing
+# ================================
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def iter_rows(stream, fmt):
+    """Yield ``(line_number, row_dict)`` from a text stream, or ``(line_number, None)`` for unparsable lines."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def text_stream(binary):
+    # Uploaded files are binary.
+    return io.TextIOWrapper(binary, encoding=ENCODING, newline='')
+
+
+def find_encoding_error(binary):
+    """``(line_number, message)`` for the first bytes that are not UTF-8, or None.
+
+    Reads ``binary`` in chunks and rewinds it, so it must be seekable.
+    """
+    # Plain UTF-8 after skipping a BOM by hand: utf-8-sig would strip it
+    # itself and report positions counted from after it.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    line_number = 1
+    try:
+        if binary.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+            binary.seek(0)
+        for chunk in iter(lambda: binary.read(CHECK_CHUNK_SIZE), b''):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as exc:
+                # exc.object is this chunk after any bytes of a character split from the last one.
+                data = exc.object
+                return line_number + data.count(b'\n', 0, exc.start), _encoding_message(data[exc.start])
+            line_number += chunk.count(b'\n')
+        try:
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError as exc:
+            return line_number, _encoding_message(exc.object[exc.start])
+    finally:
+        binary.seek(0)
+    return None
+
+
+def _encoding_message(byte):
+    return f'Not UTF-8 text (byte 0x{byte:02x}); save the file as UTF-8 (e.g. "CSV UTF-8" in Excel) and import it again.'
+
+
+# ================================
+# Import
+# ================================
+def _write_batch(invoices):
+    for attempt in range(2):
+        numbers = reserve(len(invoices))
+        for invoice, number in zip(invoices, numbers):
+            invoice.invoice_number = number
+        try:
+            with transaction.atomic():
+                Invoice.objects.bulk_create(invoices)
+                # Table version first, then rollups: the order the save signals use.
+                list_cache.bump_version()
+                apply_invoices(invoices)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+            # A number was written outside the sequence; skip past it and retry.
+            resync()
+
+
+def import_invoices(rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        _write_batch(batch)
+        report.created += len(batch)
+        report.elapsed = time.perf_counter() - report.started
+        batch.clear()
+        if on_batch:
+            on_batch(report)
+
+    for line_number, row in rows:
+        if row is None:
+            report.errors.append((line_number, {'__all__': ['Could not parse row.']}))
+            continue
+        form = InvoiceForm(data=row)
+        if not form.is_valid():
+            report.errors.append((line_number, {field: list(messages) for field, messages in form.errors.items()}))
+            continue
+        batch.append(vat.apply(form.save(commit=False)))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def import_file(binary, fmt, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Import a binary CSV / JSON Lines file; nothing is written if it is not UTF-8."""
+    encoding_error = find_encoding_error(binary)
+    if encoding_error is not None:
+        line_number, message = encoding_error
+        report = ImportReport()
+        report.errors.append((line_number, {'__all__': [message]}))
+        return report
+    return import_invoices(iter_rows(text_stream(binary), fmt), batch_size=batch_size, on_batch=on_batch)
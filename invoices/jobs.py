@@ -0,0 +1,77 @@
+"""
+DB-backed PDF render queue.
+
+Jobs are ``RenderJob`` rows. Workers (``manage.py render_worker``) claim them
+with a conditional UPDATE, so several workers can share the table without a
+broker or row locks. A job is unique per (invoice, kind, content digest):
+asking for the same document again joins the existing job instead of queueing
+a second render.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RenderJob
+from .pdf_cache import get_pdf_cache
+
+MAX_ATTEMPTS = 3
+
+
+def enqueue(invoice, kind, content_key):
+    job, created = RenderJob.objects.get_or_create(
+        invoice=invoice, kind=kind, content_key=content_key,
+    )
+    if not created and job.status in (RenderJob.STATUS_DONE, RenderJob.STATUS_FAILED):
+        # Only reached on a cache miss, so a finished job's PDF has been
+        # evicted (or it failed) and the document needs rendering again.
+        RenderJob.objects.filter(pk=job.pk, status=job.status).update(
+            status=RenderJob.STATUS_PENDING, attempts=0, error='',
+            started_at=None, finished_at=None,
+        )
+        job.refresh_from_db()
+    return job
+
+
+def claim_next(batch=10):
+    pending = RenderJob.objects.filter(status=RenderJob.STATUS_PENDING).order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True)[:batch]:
+        claimed = RenderJob.objects.filter(pk=job_id, status=RenderJob.STATUS_PENDING).update(
+            status=RenderJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return RenderJob.objects.select_related('invoice').get(pk=job_id)
+    return None
+
+
+def complete(job, content_key, pdf):
+    # The row may have changed since the job was queued; cache under the
+    # digest of what was actually rendered so the next request hits it.
+    get_pdf_cache().set(job.invoice_id, content_key, pdf)
+    RenderJob.objects.filter(pk=job.pk).update(
+        status=RenderJob.STATUS_DONE, error='', finished_at=timezone.now(),
+    )
+
+
+def fail(job, error):
+    status = RenderJob.STATUS_PENDING if job.attempts < MAX_ATTEMPTS else RenderJob.STATUS_FAILED
+    RenderJob.objects.filter(pk=job.pk).update(
+        status=status, error=error, finished_at=timezone.now(),
+    )
+
+
+def requeue_stale(timeout):
+    # Jobs left running by a worker that died mid-render.
+    cutoff = timezone.now() - timeout
+    return RenderJob.objects.filter(
+        status=RenderJob.STATUS_RUNNING, started_at__lt=cutoff,
+    ).update(status=RenderJob.STATUS_PENDING)
+
+
+def prune(age):
+    cutoff = timezone.now() - age
+    deleted, _ = RenderJob.objects.filter(
+        status__in=[RenderJob.STATUS_DONE, RenderJob.STATUS_FAILED], finished_at__lt=cutoff,
+    ).delete()
+    return deleted
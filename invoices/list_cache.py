@@ -0,0 +1,69 @@
+"""
+Response cache for the invoice table partial fetched by the list page's
+live search.
+
+Entries are keyed on the normalized query parameters plus a table version
+that every invoice write bumps in its own transaction (``bump_version``), so
+a cached table is never served after the data changes and nothing needs
+deleting. The version is a database counter (``generations.py``), so this
+holds across processes even with a process-local cache. The same key is the
+response's ETag: a browser revalidating a table it already holds gets a 304
+without the list query running at all.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import generations
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+VERSION_NAME = "invoice-table"
+# Parameters the table depends on; anything else (e.g. a cache-busting
+# timestamp) is left out of the key.
+PARAMS = ("search", "date_from", "date_to", "after", "before", "page")
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "INVOICE_LIST_CACHE", {})}
+
+
+def _cache():
+    return caches[_config()["CACHE_ALIAS"]]
+
+
+def table_version():
+    return generations.current([VERSION_NAME])[0]
+
+
+def bump_version():
+    generations.bump(VERSION_NAME)
+
+
+def normalize(params):
+    """The table's parameters with whitespace in the search collapsed and blanks dropped."""
+    normalized = {}
+    for name in PARAMS:
+        value = " ".join(params.get(name, "").split())
+        if value:
+            normalized[name] = value
+    return normalized
+
+
+def table_key(params):
+    """Digest of the table version and ``params``; also used as the ETag."""
+    descriptor = "&".join(f"{name}={value}" for name, value in sorted(params.items()))
+    return hashlib.sha1(f"{table_version()}|{descriptor}".encode()).hexdigest()
+
+
+def get_html(key):
+    return _cache().get(f"invoice-table:{key}")
+
+
+def set_html(key, html):
+    _cache().set(f"invoice-table:{key}", html, _config()["TIMEOUT"])
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoices.archive import archive_invoices, unarchived
+from invoices.models import Invoice
+from invoices.rendering import POOLS, TEMPLATES
+
+
+class Command(BaseCommand):
+    help = (
+        "Finalise historical invoices: render their PDFs in parallel and store them in the archive. "
+        "Invoices that are already archived are skipped, so the command can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="Only invoices dated before this day (YYYY-MM-DD).")
+        parser.add_argument("--kind", choices=sorted(TEMPLATES), help="Archive one kind only (default: both).")
+        parser.add_argument("--workers", type=int, help="Render workers (defaults to BULK_EXPORT_WORKERS / CPU count).")
+        parser.add_argument("--pool", choices=POOLS, default="process")
+
+    def handle(self, *args, **options):
+        queryset = Invoice.objects.all()
+        if options["before"]:
+            before = parse_date(options["before"])
+            if before is None:
+                raise CommandError(f"Invalid date: {options['before']}")
+            queryset = queryset.filter(date__lt=before)
+
+        kinds = [options["kind"]] if options["kind"] else list(TEMPLATES)
+        total = sum(unarchived(kind, queryset).count() for kind in kinds)
+        if not total:
+            self.stdout.write("Nothing to archive.")
+            return
+        self.stdout.write(f"Archiving {total} PDFs with {options['pool']} workers...")
+
+        done = [0]
+
+        def on_done(kind, invoice, ok):
+            done[0] += 1
+            if not ok:
+                self.stderr.write(f"  {kind} for invoice #{invoice.pk} failed to render")
+            if done[0] % 100 == 0:
+                self.stdout.write(f"  {done[0]}/{total}")
+
+        start = time.perf_counter()
+        counts = archive_invoices(queryset, kinds, pool=options["pool"], workers=options["workers"], on_done=on_done)
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Archived {counts['archived']} PDFs in {seconds:.1f} s ({counts['archived'] / seconds:.1f}/s): "
+            f"{counts['new_blobs']} new blobs, {counts['archived'] - counts['new_blobs']} deduplicated, "
+            f"{counts['failed']} failed."
+        )
+        if counts["failed"]:
+            raise CommandError(f"{counts['failed']} PDFs failed to render; re-run to retry them.")
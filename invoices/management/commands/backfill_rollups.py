@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoices.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily / monthly revenue rollups from the Invoice table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} rollup rows in {time.perf_counter() - start:.2f}s"
+        ))
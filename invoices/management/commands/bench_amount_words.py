@@ -0,0 +1,68 @@
+import itertools
+import random
+import subprocess
+import sys
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from num2words import num2words
+
+from invoices.amount_words import amount_in_words, integer_words
+from invoices.benchmarking import format_summary, measure, summarize
+
+BATCH = 100
+
+
+def legacy_words(num):
+    # The previous rendering.num_to_words.
+    int_part = int(num)
+    decimal_part = int(round((num - int_part) * 100))
+    words = num2words(int_part).replace(',', '') + " Dirhams"
+    if decimal_part > 0:
+        words += " and " + num2words(decimal_part).replace(',', '') + " Fils"
+    return words + " Only"
+
+
+class Command(BaseCommand):
+    help = "Time amount_in_words against the old helper, then the cold imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.bench_words(rng, options["iterations"])
+        self.cold_import()
+
+    def bench_words(self, rng, iterations):
+        # Invoice totals as the PDFs see them: amount * 1.05, unrounded.
+        amounts = [self.random_amount(rng, places=2) * Decimal("1.05") for _ in range(200)]
+        picks = itertools.cycle(amounts)
+
+        def batch(func):
+            # Single calls are too short to time; each sample is BATCH calls.
+            return lambda: [func(next(picks)) for _ in range(BATCH)]
+
+        legacy = measure(batch(legacy_words), iterations)
+        integer_words.cache_clear()
+        current = measure(batch(amount_in_words), iterations)
+        self.stdout.write(f"per {BATCH} calls")
+        self.stdout.write(f"  legacy num_to_words: {format_summary(summarize(legacy))}")
+        self.stdout.write(f"  amount_in_words:     {format_summary(summarize(current))}")
+        self.stdout.write(f"word cache: {integer_words.cache_info()}")
+
+    def cold_import(self):
+        script = "import time; s = time.perf_counter(); import {}; print((time.perf_counter() - s) * 1000)"
+        for module in ("invoices.amount_words", "num2words"):
+            output = subprocess.run(
+                [sys.executable, "-c", script.format(module)], capture_output=True, text=True,
+            ).stdout.strip()
+            if output:
+                self.stdout.write(f"cold import {module}: {float(output):.1f} ms")
+
+    def random_amount(self, rng, places=None):
+        places = rng.choice((0, 1, 2, 3, 4)) if places is None else places
+        whole = rng.choice((rng.randint(0, 999), rng.randint(1000, 99999), rng.randint(100000, 99999999)))
+        fraction = rng.randint(0, 10 ** places - 1) if places else 0
+        return Decimal(f"{whole}.{fraction:0{places}d}") if places else Decimal(whole)
@@ -0,0 +1,48 @@
+import random
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.benchmarking import CLIENT_SUFFIXES, CLIENT_WORDS, measure, percentile, summarize
+from invoices.client_directory import ClientDirectory, config
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a client directory with synthetic clients and time autocomplete prefix lookups; "
+        "fails if p99 is over --max-p99-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=5000)
+        parser.add_argument("--max-p99-ms", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        limits = config()
+        directory = ClientDirectory(
+            max(limits["MAX_CLIENTS"], options["clients"]), limits["MAX_FIELD_CHARS"],
+            limits["SYNC_INTERVAL"], limits["REBUILD_INTERVAL"],
+        )
+        for pk in range(1, options["clients"] + 1):
+            name = f"{rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_SUFFIXES)} {pk}"
+            directory.add((pk, name, f"Office {pk}, Business Bay, Dubai", f"05{pk:08d}"))
+        names = sorted({name for _pk, name, _a, _m in directory._entries.values()})
+        size_mb = sum(sys.getsizeof(key) + sum(map(sys.getsizeof, entry))
+                      for key, entry in directory._entries.items()) / 1024 / 1024
+        self.stdout.write(f"{len(directory)} clients, ~{size_mb:.0f} MB of keys and entries")
+
+        # Prefixes as typed: 1-8 characters of a real name.
+        prefixes = iter([rng.choice(names)[:rng.randint(1, 8)] for _ in range(options["queries"] + 1)])
+        timings = measure(lambda: directory.search(next(prefixes)), options["queries"])
+        summary = summarize(timings)
+        # Sub-millisecond, so report microseconds rather than format_summary's ms.
+        self.stdout.write("search: " + ", ".join(
+            f"{label} {value * 1000:.0f} us" for label, value in (
+                ("mean", sum(timings) / len(timings)), ("p50", percentile(timings, 50)),
+                ("p95", percentile(timings, 95)), ("p99", percentile(timings, 99)),
+            )
+        ))
+        if summary["p99_ms"] > options["max_p99_ms"]:
+            raise CommandError(f"p99 {summary['p99_ms']} ms is over {options['max_p99_ms']} ms")
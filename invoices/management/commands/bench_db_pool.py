@@ -0,0 +1,60 @@
+import copy
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+from invoices.benchmarking import format_summary, measure, summarize
+from invoices.models import Invoice
+
+BACKENDS = {
+    "mysql": ("django.db.backends.mysql", "billing_system.db_pool.mysql"),
+    "sqlite": ("django.db.backends.sqlite3", "billing_system.db_pool.sqlite3"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a per-request connect / query / close cycle on the default database "
+        "with plain connections against the pooled backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--pool-size", type=int, default=5)
+
+    def handle(self, *args, **options):
+        default = connections["default"]
+        if default.vendor not in BACKENDS:
+            raise CommandError(f"No pooled backend for {default.vendor}.")
+        plain_engine, pooled_engine = BACKENDS[default.vendor]
+        table = default.ops.quote_name(Invoice._meta.db_table)
+        # A typical light request: one indexed lookup.
+        sql = f"SELECT id FROM {table} ORDER BY id DESC LIMIT 10"
+
+        results = {}
+        for label, engine, alias in (("plain", plain_engine, "bench-plain"), ("pooled", pooled_engine, "bench-pooled")):
+            settings_dict = copy.deepcopy(default.settings_dict)
+            settings_dict.update({"ENGINE": engine, "CONN_MAX_AGE": 0, "POOL": {"SIZE": options["pool_size"]}})
+            wrapper = load_backend(engine).DatabaseWrapper(settings_dict, alias)
+
+            def request_cycle():
+                wrapper.ensure_connection()
+                with wrapper.cursor() as cursor:
+                    cursor.execute(sql)
+                    cursor.fetchall()
+                wrapper.close()
+
+            results[label] = summarize(measure(request_cycle, options["requests"]))
+            self.stdout.write(f"{label:7} {format_summary(results[label])}")
+
+        from billing_system.db_pool import pool_stats
+
+        stats = pool_stats().get("bench-pooled", {})
+        self.stdout.write(
+            f"pool: {stats.get('created', 0)} created, {stats.get('reused', 0)} reused, "
+            f"{stats.get('discarded', 0)} discarded, {stats.get('idle', 0)} idle"
+        )
+        if results["plain"]["p50_ms"]:
+            saving = 1 - results["pooled"]["p50_ms"] / results["plain"]["p50_ms"]
+            self.stdout.write(f"p50 per request: {saving:.0%} lower with pooling")
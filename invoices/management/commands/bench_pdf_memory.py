@@ -0,0 +1,75 @@
+import copy
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.models import Invoice
+from invoices.pdf_spool import PAGE_RE, PDFLimitExceeded, render_pdf_file, reset_peak_rss, status_kb
+from invoices.rendering import html_to_pdf, render_html
+
+LINE = "{n}. Supply, install and test ductwork with brackets and insulation as per drawing M-{n:03d}."
+
+
+class Command(BaseCommand):
+    help = (
+        "Render PDFs with increasingly long work descriptions, in-process (html_to_pdf) and in file "
+        "mode (pdf_spool.render_pdf_file), and report pages, time and peak RSS growth per render."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, nargs="+", default=[20, 200, 1000, 3000],
+                            help="Work description sizes, in lines.")
+        parser.add_argument("--kind", choices=["invoice", "quotation"], default="invoice")
+        parser.add_argument("--max-rss-mb", type=int,
+                            help="Fail if a file-mode render grows its process by more than this.")
+
+    def handle(self, *args, **options):
+        source = Invoice.objects.order_by("-pk").first()
+        if source is None:
+            raise CommandError("No invoice to render.")
+        html_to_pdf(render_html(source, options["kind"])[0])  # warm assets and pisa first
+        can_reset = reset_peak_rss()
+
+        failures = []
+        self.stdout.write(f"{'lines':>6} {'mode':9} {'pages':>5} {'time':>8} {'worker RSS +':>13} {'render RSS +':>13}")
+        for lines in options["lines"]:
+            invoice = copy.copy(source)
+            invoice.work_description = "\n".join(LINE.format(n=n) for n in range(1, lines + 1))
+            html = render_html(invoice, options["kind"])[0]
+
+            # In-process: the whole PDF is built and held by this process.
+            before = self.start_peak(can_reset)
+            start = time.perf_counter()
+            pdf = html_to_pdf(html)
+            seconds = time.perf_counter() - start
+            growth = self.peak_growth(before)
+            self.row(lines, "buffered", len(PAGE_RE.findall(pdf)) if pdf else "-", seconds, growth, growth)
+
+            # File mode: rendered in a child, this process only holds a file handle.
+            before = self.start_peak(can_reset)
+            try:
+                pdf_file, stats = render_pdf_file(html, max_pages=0)
+            except PDFLimitExceeded as exc:
+                self.stdout.write(f"{lines:>6} {'file':9} {exc}")
+                failures.append(f"{lines} lines: {exc}")
+                continue
+            pdf_file.close()
+            render_growth = stats.get("rss_growth_kb")
+            self.row(lines, "file", stats["pages"], stats["seconds"], self.peak_growth(before), render_growth)
+            if options["max_rss_mb"] and render_growth is not None and render_growth > options["max_rss_mb"] * 1024:
+                failures.append(f"{lines} lines: {render_growth // 1024} MB peak RSS growth")
+
+        if not can_reset:
+            self.stdout.write("(in-process peak RSS needs /proc/self/clear_refs; not available here)")
+        if failures:
+            raise CommandError("; ".join(failures))
+
+    def start_peak(self, can_reset):
+        return status_kb("VmRSS") if can_reset and reset_peak_rss() else None
+
+    def peak_growth(self, before):
+        return status_kb("VmHWM") - before if before is not None else None
+
+    def row(self, lines, mode, pages, seconds, worker_kb, render_kb):
+        worker, render = (f"{kb / 1024:.1f} MB" if kb is not None else "n/a" for kb in (worker_kb, render_kb))
+        self.stdout.write(f"{lines:>6} {mode:9} {pages!s:>5} {seconds:7.2f}s {worker:>13} {render:>13}")
@@ -0,0 +1,49 @@
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from reportlab import rl_config
+from xhtml2pdf import pisa
+
+from invoices.benchmarking import format_summary, measure, summarize
+from invoices.models import Invoice
+from invoices.pdf_assets import ASSET_SCHEME, get_pdf_assets
+from invoices.rendering import TEMPLATES, html_to_pdf, pdf_context, render_html
+
+
+class Command(BaseCommand):
+    help = "Compare PDF render latency with per-request setup against the warmed asset layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--kind", choices=["invoice", "quotation", "both"], default="both")
+        parser.add_argument("--invoice", type=int, help="Invoice pk to render (defaults to the latest).")
+
+    def handle(self, *args, **options):
+        if options["invoice"]:
+            invoice = Invoice.objects.filter(pk=options["invoice"]).first()
+        else:
+            invoice = Invoice.objects.order_by("-pk").first()
+        if invoice is None:
+            raise CommandError("No invoice to render.")
+
+        assets = get_pdf_assets().load()
+        kinds = ["invoice", "quotation"] if options["kind"] == "both" else [options["kind"]]
+        iterations = max(1, options["iterations"])
+
+        tuned_a85 = rl_config.useA85
+        for kind in kinds:
+            rl_config.useA85 = 1  # reportlab's default, as before the asset layer
+            before = measure(lambda: self.render_uncached(invoice, kind, assets), iterations)
+            rl_config.useA85 = tuned_a85
+            after = measure(lambda: html_to_pdf(render_html(invoice, kind)[0]), iterations)
+            self.stdout.write(f"{kind} (invoice #{invoice.pk}, {iterations} runs)")
+            self.stdout.write(f"  before: {format_summary(summarize(before))}")
+            self.stdout.write(f"  after : {format_summary(summarize(after))}")
+
+    def render_uncached(self, invoice, kind, assets):
+        # The old per-request path: resolve the template and let pisa load the
+        # logo from disk on every render.
+        html = get_template(TEMPLATES[kind]).render(pdf_context(invoice))
+        html = html.replace(ASSET_SCHEME, f"{assets.asset_dir}/")
+        pisa.CreatePDF(html, dest=BytesIO())
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from invoices.benchmarking import bench_superuser
+from invoices.models import Invoice
+from invoices.pdf_cache import get_pdf_cache
+from invoices.rendering import POOLS, render_many
+
+URL_NAMES = {"invoice": "generate_pdf", "quotation": "generate_quotation"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the latest N invoices' PDFs by requesting the PDF view once per invoice, "
+        "then with rendering.render_many on each pool type, with the PDF cache cleared before each run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=20, help="Number of invoices to render.")
+        parser.add_argument("--kind", choices=sorted(URL_NAMES), default="invoice")
+        parser.add_argument("--workers", type=int, help="Pool size (defaults to BULK_EXPORT_WORKERS / CPU count).")
+        parser.add_argument("--pools", nargs="+", choices=POOLS, default=list(POOLS))
+
+    def handle(self, *args, **options):
+        pks = list(Invoice.objects.order_by("-pk").values_list("pk", flat=True)[:options["count"]])
+        if not pks:
+            raise CommandError("No invoices to render; seed some with `bench_suite` or the importer.")
+        kind = options["kind"]
+
+        client = Client()
+        url_name = URL_NAMES[kind]
+
+        def view_loop():
+            for pk in pks:
+                response = client.get(reverse(url_name, args=[pk]), {"async": "0"})
+                if response.status_code != 200:
+                    raise CommandError(f"{url_name} returned {response.status_code} for invoice #{pk}")
+
+        with bench_superuser() as user:
+            client.force_login(user)
+            results = [("view loop", self.timed(pks, view_loop))]
+        for pool in options["pools"]:
+            results.append((
+                f"render_many ({pool})",
+                self.timed(pks, lambda: render_many(pks, kind, pool=pool, workers=options["workers"])),
+            ))
+
+        baseline = results[0][1]
+        self.stdout.write(f"{len(pks)} {kind} PDFs")
+        for label, seconds in results:
+            self.stdout.write(
+                f"  {label:24} {seconds:7.2f} s  {len(pks) / seconds:6.1f} PDFs/s  x{baseline / seconds:.1f}"
+            )
+
+    def timed(self, pks, func):
+        cache = get_pdf_cache()
+        for pk in pks:
+            cache.invalidate(pk)
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
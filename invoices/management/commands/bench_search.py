@@ -0,0 +1,65 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from invoices.benchmarking import (
+    CLIENT_WORDS, add_seed_arguments, check_seed_database, clear_seeded, format_summary, measure, seed_invoices,
+    summarize,
+)
+from invoices.models import Invoice
+from invoices.search import contains_q, search_invoices
+
+PAGE_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic invoices and compare invoice list search latency before and after the search indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Seed the table up to this many invoices.")
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="Delete the seeded invoices afterwards.")
+        parser.add_argument("--explain", action="store_true", help="Print the query plan of one search.")
+        add_seed_arguments(parser)
+
+    def handle(self, *args, **options):
+        check_seed_database(options["i_know"])
+        self.stdout.write(f"Seeding up to {options['rows']} invoices...")
+        added = seed_invoices(options["rows"], batch_size=options["batch_size"], stdout=self.stdout)
+        self.stdout.write(f"Added {added}; table has {Invoice.objects.count()} invoices ({connection.vendor}).")
+
+        rng = random.Random(7)
+        searches = [self.sample_query(rng) for _ in range(options["queries"])]
+        base = Invoice.objects.order_by("-created_at")
+
+        def run(build):
+            queries = iter(searches * 2)  # warmup + timed runs
+
+            def page():
+                qs = build(next(queries))
+                qs.count()  # the paginator counts before slicing
+                list(qs[:PAGE_SIZE])
+            return page
+
+        before = measure(run(lambda q: base.filter(contains_q(q))), len(searches) - 1)
+        after = measure(run(lambda q: search_invoices(base, q)), len(searches) - 1)
+        self.stdout.write(f"before (icontains): {format_summary(summarize(before))}")
+        self.stdout.write(f"after  (indexed):   {format_summary(summarize(after))}")
+
+        if options["explain"]:
+            self.stdout.write(search_invoices(base, searches[0])[:PAGE_SIZE].explain())
+
+        if options["clear"]:
+            self.stdout.write(f"Deleted {clear_seeded()} seeded invoices.")
+
+    def sample_query(self, rng):
+        roll = rng.random()
+        if roll < 0.5:
+            return rng.choice(CLIENT_WORDS[2:])
+        if roll < 0.7:
+            return f"{rng.choice(CLIENT_WORDS[2:])} {rng.choice(CLIENT_WORDS[2:])}"
+        if roll < 0.85:
+            return f"REF-{rng.randint(2020, 2026)}-{rng.randint(1, 999):03d}"
+        return str(rng.randint(100, 999))
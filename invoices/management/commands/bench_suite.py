@@ -0,0 +1,155 @@
+import json
+import platform
+import random
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from invoices.benchmarking import (
+    CLIENT_WORDS, add_seed_arguments, bench_superuser, check_seed_database, format_summary, seed_invoices, summarize,
+)
+from invoices.models import Invoice
+from invoices.pdf_cache import get_pdf_cache
+
+SCENARIOS = ("list_search", "analytics", "analytics_csv", "pdf_invoice", "pdf_quotation")
+PERIODS = ("this_month", "last_month", "last_6_months", "this_year", "custom")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic invoices and measure latency and throughput of the list search, analytics, "
+        "CSV export and PDF endpoints through the test client; writes JSON results."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000, help="Seed the table up to this many invoices (10k-1M).")
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="Run only these scenarios.")
+        parser.add_argument("--pdf-cache", action="store_true", help="Let PDF requests hit the rendered-PDF cache.")
+        parser.add_argument("--output", help="Write JSON results to this file.")
+        parser.add_argument("--compare", help="Earlier JSON results to print p95 deltas against.")
+        parser.add_argument("--seed", type=int, default=1)
+        add_seed_arguments(parser)
+
+    def handle(self, *args, **options):
+        check_seed_database(options["i_know"])
+        self.rng = random.Random(options["seed"])
+        self.stdout.write(f"Seeding up to {options['rows']} invoices ({connection.vendor})...")
+        seed_invoices(options["rows"], seed=options["seed"])
+        self.invoice_ids = list(Invoice.objects.order_by("-pk").values_list("pk", flat=True)[:200])
+        if not self.invoice_ids:
+            raise CommandError("No invoices to benchmark.")
+
+        self.client = Client()
+        self.pdf_cache = options["pdf_cache"]
+
+        results = {}
+        with bench_superuser() as user:
+            self.client.force_login(user)
+            for name in options["only"] or SCENARIOS:
+                results[name] = self.run_scenario(
+                    getattr(self, f"request_{name}"), options["requests"], options["warmup"],
+                )
+                self.stdout.write(
+                    f"{name:14} {format_summary(results[name])}, {results[name]['throughput_rps']:.1f} req/s"
+                )
+
+        report = {"meta": self.meta(options), "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if options["compare"]:
+            self.compare(results, options["compare"])
+
+    def run_scenario(self, make_request, requests, warmup):
+        for _ in range(warmup):
+            make_request()
+        timings = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = make_request()
+            if response.streaming:
+                for _chunk in response.streaming_content:
+                    pass
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+        elapsed = time.perf_counter() - started
+        summary = summarize(timings)
+        summary["throughput_rps"] = round(requests / elapsed, 2) if elapsed else 0.0
+        summary["errors"] = errors
+        return summary
+
+    # ================================
+    # Scenarios
+    # ================================
+    def request_list_search(self):
+        roll = self.rng.random()
+        if roll < 0.6:
+            search = self.rng.choice(CLIENT_WORDS[2:])
+        elif roll < 0.8:
+            search = f"REF-{self.rng.randint(2020, 2026)}"
+        else:
+            search = str(self.rng.randint(100, 999))
+        return self.client.get(reverse("invoice_list"), {"search": search}, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def request_analytics(self):
+        return self.client.get(reverse("analytics"), {"period": self.rng.choice(PERIODS)})
+
+    def request_analytics_csv(self):
+        return self.client.get(reverse("export_analytics_csv"), {"period": self.rng.choice(PERIODS)})
+
+    def request_pdf_invoice(self):
+        return self.request_pdf("generate_pdf")
+
+    def request_pdf_quotation(self):
+        return self.request_pdf("generate_quotation")
+
+    def request_pdf(self, url_name):
+        pk = self.rng.choice(self.invoice_ids)
+        if not self.pdf_cache:
+            get_pdf_cache().invalidate(pk)
+        return self.client.get(reverse(url_name, args=[pk]), {"async": "0"})
+
+    # ================================
+    # Reporting
+    # ================================
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+        return {
+            "commit": commit,
+            "timestamp": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "rows": Invoice.objects.count(),
+            "requests": options["requests"],
+            "pdf_cache": options["pdf_cache"],
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        }
+
+    def compare(self, results, path):
+        with open(path) as handle:
+            baseline = json.load(handle)
+        self.stdout.write(f"p95 vs {path} ({baseline['meta'].get('commit') or 'unknown commit'}):")
+        for name, summary in results.items():
+            before = baseline["results"].get(name)
+            if not before:
+                continue
+            change = (summary["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            self.stdout.write(f"  {name:14} {before['p95_ms']:.1f} -> {summary['p95_ms']:.1f} ms ({change:+.1f}%)")
@@ -0,0 +1,49 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.importer import DEFAULT_BATCH_SIZE, detect_format, import_file
+
+
+class Command(BaseCommand):
+    help = "Import invoices from a CSV or JSON Lines file, validated with the invoice form rules."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--errors-out", help="Write the per-row error report to this CSV file.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or detect_format(path)
+
+        def progress(report):
+            self.stdout.write(
+                f"  {report.created} imported, {report.failed} rejected "
+                f"({report.rows_per_second:.0f} rows/s)"
+            )
+
+        try:
+            with open(path, "rb") as binary:
+                report = import_file(binary, fmt, batch_size=options["batch_size"], on_batch=progress)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        if options["errors_out"]:
+            with open(options["errors_out"], "w", newline="") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(["line", "errors"])
+                for line, errors in report.errors:
+                    writer.writerow([line, json.dumps(errors)])
+
+        for line, errors in report.errors[:20]:
+            self.stderr.write(f"line {line}: {json.dumps(errors)}")
+        if report.failed > 20:
+            self.stderr.write(f"... and {report.failed - 20} more rejected rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created} invoices, rejected {report.failed}, "
+            f"in {report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s)"
+        ))
@@ -0,0 +1,92 @@
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a cold start imports: the WSGI app plus the URLconf (and so the views)
+# resolved on the first request.
+TARGET = "import billing_system.wsgi, billing_system.urls"
+
+# Modules only the PDF and amount-in-words code paths may pull in.
+DEFERRED_MODULES = ("xhtml2pdf", "reportlab", "num2words", "pypdf", "PIL")
+
+TIMING_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+{TARGET}
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed, ','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))
+"""
+
+
+class Command(BaseCommand):
+    help = "Profile cold-import cost of the WSGI app per module, optionally failing over a time budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Modules to list by self time.")
+        parser.add_argument("--runs", type=int, default=5, help="Cold imports to time for the budget check.")
+        parser.add_argument(
+            "--budget-ms", type=float, nargs="?", const=-1,
+            help="Fail if the median cold import exceeds this (default settings.IMPORT_TIME_BUDGET_MS) "
+                 "or if a PDF-only module is imported at startup.",
+        )
+        parser.add_argument("--warm", action="store_true", help="Profile with PDF_ASSETS_WARM on.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PDF_ASSETS_WARM="1" if options["warm"] else "0")
+        self.profile(env, options["top"])
+        if options["budget_ms"] is not None:
+            budget = options["budget_ms"]
+            if budget < 0:
+                budget = getattr(settings, "IMPORT_TIME_BUDGET_MS", 600)
+            self.check_budget(env, options["runs"], budget, options["warm"])
+
+    def child(self, args, env):
+        return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+
+    def profile(self, env, top):
+        result = self.child(["-X", "importtime", "-c", TARGET], env)
+        if result.returncode:
+            raise CommandError(result.stderr.strip())
+
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules.append((int(self_us), int(cumulative_us), name.strip()))
+
+        packages = defaultdict(int)
+        for self_us, _cumulative, name in modules:
+            packages[name.split(".")[0]] += self_us
+
+        total = sum(self_us for self_us, _c, _n in modules)
+        self.stdout.write(f"{len(modules)} modules, {total / 1000:.1f} ms total import time")
+        self.stdout.write("\nBy package (self time):")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {package}")
+        self.stdout.write("\nBy module (self / cumulative):")
+        for self_us, cumulative_us, name in sorted(modules, reverse=True)[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms {cumulative_us / 1000:8.1f} ms  {name}")
+
+    def check_budget(self, env, runs, budget, warm):
+        timings = []
+        loaded = ""
+        for _ in range(max(1, runs)):
+            result = self.child(["-c", TIMING_SCRIPT], env)
+            if result.returncode:
+                raise CommandError(result.stderr.strip())
+            elapsed, loaded = result.stdout.strip().splitlines()[-1].partition(" ")[::2]
+            timings.append(float(elapsed))
+
+        median = statistics.median(timings)
+        self.stdout.write(f"\nCold import: median {median:.1f} ms over {len(timings)} runs (budget {budget:.0f} ms)")
+        if loaded and not warm:
+            raise CommandError(f"PDF-only modules imported at startup: {loaded}")
+        if median > budget:
+            raise CommandError(f"Cold import {median:.1f} ms is over the {budget:.0f} ms budget.")
+        self.stdout.write(self.style.SUCCESS("Within budget."))
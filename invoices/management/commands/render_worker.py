@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from invoices import jobs
+from invoices.rendering import html_to_pdf, render_html
+
+POOL_BROKEN = "Render process exited unexpectedly"
+
+
+class Command(BaseCommand):
+    help = "Render queued invoice / quotation PDFs from the RenderJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Number of render processes.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--stale-after", type=int, default=300, help="Requeue jobs running longer than this many seconds.")
+        parser.add_argument("--prune-after", type=int, default=24, help="Delete finished jobs older than this many hours.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        poll_interval = options["poll_interval"]
+        stale_after = timedelta(seconds=options["stale_after"])
+        prune_after = timedelta(hours=options["prune_after"])
+
+        self.stdout.write(f"Render worker started with {concurrency} process(es)")
+        running = {}
+        last_housekeeping = 0
+
+        pool = ProcessPoolExecutor(max_workers=concurrency)
+        try:
+            while True:
+                close_old_connections()
+
+                if time.monotonic() - last_housekeeping > 60:
+                    jobs.requeue_stale(stale_after)
+                    jobs.prune(prune_after)
+                    last_housekeeping = time.monotonic()
+
+                while len(running) < concurrency:
+                    job = jobs.claim_next()
+                    if job is None:
+                        break
+                    try:
+                        html, content_key = render_html(job.invoice, job.kind)
+                    except Exception as exc:
+                        jobs.fail(job, str(exc))
+                        self.stderr.write(f"Job {job.pk} failed: {exc}")
+                        continue
+                    try:
+                        running[pool.submit(html_to_pdf, html)] = (job, content_key)
+                    except BrokenProcessPool:
+                        jobs.fail(job, POOL_BROKEN)
+                        pool = self.restart_pool(pool, running, concurrency)
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job, content_key = running.pop(future)
+                    try:
+                        pdf = future.result()
+                    except BrokenProcessPool:
+                        jobs.fail(job, POOL_BROKEN)
+                        broken = True
+                        continue
+                    except Exception as exc:
+                        jobs.fail(job, str(exc))
+                        self.stderr.write(f"Job {job.pk} failed: {exc}")
+                        continue
+                    if pdf is None:
+                        jobs.fail(job, "PDF generation error")
+                        self.stderr.write(f"Job {job.pk} failed: PDF generation error")
+                    else:
+                        jobs.complete(job, content_key, pdf)
+                        self.stdout.write(f"Job {job.pk}: rendered {job.kind} for invoice #{job.invoice_id}")
+                if broken:
+                    pool = self.restart_pool(pool, running, concurrency)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def restart_pool(self, pool, running, concurrency):
+        # A render process died (e.g. killed for memory) and took the pool with
+        # it. Jobs still in flight go back to the queue; each retry counts as an
+        # attempt, so a document that keeps killing its process ends up failed.
+        pool.shutdown(wait=False, cancel_futures=True)
+        for job, _content_key in running.values():
+            jobs.fail(job, POOL_BROKEN)
+        self.stderr.write("Render pool broke; requeued the jobs in flight and started a new pool")
+        running.clear()
+        return ProcessPoolExecutor(max_workers=concurrency)
@@ -0,0 +1,260 @@
+"""
+Request metrics: per-view latency histograms, database query counts and time,
+named sub-spans (template rendering, PDF generation) and, with the pooled
+database backend, whether each request's connection was reused.
+
+``MetricsMiddleware`` times each request and collects the queries and spans
+recorded while it runs. Queries are counted by one execute wrapper installed
+on each connection as it opens, which charges them to the request in the
+current context; ``sync_to_async`` copies the context, so ORM calls made from
+async views count too, and concurrent requests never share a counter. Totals
+go to an in-process registry served in Prometheus text format at
+``/metrics``; the same request's breakdown is sent back in a
+``Server-Timing`` header. The registry is per process, so with several
+workers each one exposes its own series. Work done while a streaming
+response is consumed, after the view returns, is not included.
+
+Template time is recorded by ``TimedDjangoTemplates``, a drop-in for the
+Django template backend; other code marks spans with ``with span("pdf"):``.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+from billing_system.db_pool import connection_checked_out, pool_stats
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(Histogram)   # (view, method, status)
+        self.spans = defaultdict(Histogram)      # (span, view)
+        self.db_queries = defaultdict(int)       # view
+        self.db_seconds = defaultdict(float)     # view
+        self.db_connections = defaultdict(int)   # (view, outcome)
+
+    def record(self, view, method, status, duration, request_metrics):
+        with self._lock:
+            self.requests[(view, method, str(status))].observe(duration)
+            self.db_queries[view] += request_metrics.db_queries
+            self.db_seconds[view] += request_metrics.db_seconds
+            for name, seconds in request_metrics.spans.items():
+                self.spans[(name, view)].observe(seconds)
+            for outcome, count in request_metrics.db_connections.items():
+                self.db_connections[(view, outcome)] += count
+
+    def exposition(self):
+        lines = []
+        with self._lock:
+            self._histogram(lines, 'billing_request_duration_seconds', 'Request latency by view.',
+                            ('view', 'method', 'status'), self.requests)
+            self._histogram(lines, 'billing_span_duration_seconds', 'Time in named spans within a request.',
+                            ('span', 'view'), self.spans)
+            self._counter(lines, 'billing_db_queries_total', 'Database queries by view.', self.db_queries)
+            self._counter(lines, 'billing_db_query_seconds_total', 'Database time by view.', self.db_seconds)
+            self._counter(lines, 'billing_db_connections_total', 'Database connections opened by view, '
+                          'reused from the pool or newly created.', self.db_connections, ('view', 'outcome'))
+        self._pool_gauges(lines)
+        self._prerender_counters(lines)
+        return '\n'.join(lines) + '\n'
+
+    def _pool_gauges(self, lines):
+        stats = pool_stats()
+        if not stats:
+            return
+        lines += ['# HELP billing_db_pool_idle Idle pooled connections.', '# TYPE billing_db_pool_idle gauge']
+        for alias, snapshot in sorted(stats.items()):
+            lines.append(f'billing_db_pool_idle{{{_labels([("alias", alias)])}}} {snapshot["idle"]}')
+        lines += ['# HELP billing_db_pool_discarded_total Pooled connections closed as idle, unhealthy or surplus.',
+                  '# TYPE billing_db_pool_discarded_total counter']
+        for alias, snapshot in sorted(stats.items()):
+            lines.append(f'billing_db_pool_discarded_total{{{_labels([("alias", alias)])}}} {snapshot["discarded"]}')
+
+    def _prerender_counters(self, lines):
+        from .prerender import prerender_stats
+
+        stats = prerender_stats()
+        if not stats:
+            return
+        lines += ['# HELP billing_pdf_prerender_total Invoices queued or dropped for eager PDF rendering, '
+                  'and the PDFs rendered, already cached or failed.', '# TYPE billing_pdf_prerender_total counter']
+        for outcome in ('queued', 'dropped', 'rendered', 'cached', 'failed'):
+            lines.append(f'billing_pdf_prerender_total{{{_labels([("outcome", outcome)])}}} {stats[outcome]}')
+        lines += ['# HELP billing_pdf_prerender_waiting Invoices waiting for eager PDF rendering.',
+                  '# TYPE billing_pdf_prerender_waiting gauge', f'billing_pdf_prerender_waiting {stats["waiting"]}']
+
+    def _histogram(self, lines, name, help_text, label_names, series):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key, histogram in sorted(series.items()):
+            labels = _labels(zip(label_names, key))
+            for bound, count in zip(BUCKETS, histogram.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+    def _counter(self, lines, name, help_text, series, label_names=('view',)):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, value in sorted(series.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f'{name}{{{_labels(zip(label_names, key))}}} {value:g}')
+
+
+def _labels(pairs):
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.db_connections = defaultdict(int)   # 'reused' / 'created'
+        self.db_connect_seconds = 0.0
+        self.spans = defaultdict(float)
+
+
+def record_query(execute, sql, params, many, context):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.db_queries += 1
+        request_metrics.db_seconds += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Fires on every (re)connect of the same wrapper; install once.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def span(name):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.spans[name] += time.perf_counter() - start
+
+
+@receiver(connection_checked_out)
+def record_connection(sender, reused, duration, **kwargs):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.db_connections['reused' if reused else 'created'] += 1
+        request_metrics.db_connect_seconds += duration
+
+
+# ================================
+# Template backend
+# ================================
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with span('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` whose templates record a ``template`` span when rendered."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+# ================================
+# Middleware
+# ================================
+def _server_timing(request_metrics, total):
+    entries = [f'db;dur={request_metrics.db_seconds * 1000:.1f};desc="{request_metrics.db_queries} queries"']
+    if request_metrics.db_connections:
+        outcomes = ' '.join(f'{count} {outcome}' for outcome, count in sorted(request_metrics.db_connections.items()))
+        entries.append(f'db-connect;dur={request_metrics.db_connect_seconds * 1000:.1f};desc="{outcomes}"')
+    for name, seconds in request_metrics.spans.items():
+        entries.append(f'{name};dur={seconds * 1000:.1f}')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Async under ASGI, so async views are not pushed onto a thread.
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, request_metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, request_metrics, time.perf_counter() - start)
+
+    def _finish(self, request, response, request_metrics, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        registry.record(view, request.method, response.status_code, duration, request_metrics)
+        if getattr(settings, 'METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = _server_timing(request_metrics, duration)
+        return response
+
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.24 on 2026-10-17 22:21
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    RevenueRollup = apps.get_model('invoices', 'RevenueRollup')
+
+    rollups = []
+    for period, bucket in (('day', F('date')), ('month', TruncMonth('date'))):
+        for fields in (['bucket'], ['bucket', 'client_name']):
+            rows = Invoice.objects.annotate(bucket=bucket).values(*fields).annotate(
+                total=Sum('amount'), count=Count('id'),
+            ).order_by()
+            for row in rows:
+                rollups.append(RevenueRollup(
+                    period=period,
+                    period_start=row['bucket'],
+                    client_name=row.get('client_name', ''),
+                    amount=row['total'],
+                    invoice_count=row['count'],
+                ))
+    RevenueRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_renderjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('client_name', models.CharField(blank=True, max_length=255)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'client_name', 'period_start'), name='unique_revenue_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-17 22:23
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_invoice_sequence(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    InvoiceSequence = apps.get_model('invoices', 'InvoiceSequence')
+    last = Invoice.objects.aggregate(last=Max('invoice_number'))['last']
+    InvoiceSequence.objects.create(name='invoice', next_value=last + 1 if last else 10000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_revenuerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(seed_invoice_sequence, migrations.RunPython.noop),
+    ]
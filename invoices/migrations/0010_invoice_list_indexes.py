@@ -0,0 +1,42 @@
+# Generated by Django 4.2.24 on 2026-10-17 22:26
+
+from django.db import migrations, models
+
+
+FULLTEXT_INDEX = 'invoice_search_ft'
+
+
+def add_fulltext_index(apps, schema_editor):
+    # FULLTEXT indexes are MySQL-only; other backends keep the icontains scan.
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = schema_editor.quote_name(apps.get_model('invoices', 'Invoice')._meta.db_table)
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} (client_name, reference_no)"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    table = schema_editor.quote_name(apps.get_model('invoices', 'Invoice')._meta.db_table)
+    schema_editor.execute(f"ALTER TABLE {table} DROP INDEX {FULLTEXT_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'id'], name='invoice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['date', 'created_at'], name='invoice_date_created_idx'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.24 on 2026-10-17 22:38
+
+from bisect import bisect_right
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+
+BATCH_SIZE = 1000
+CENTS = Decimal('0.01')
+
+
+def vat_calculator():
+    # A frozen copy of invoices.vat.compute as of this migration, so later
+    # changes to that module cannot change what this backfill writes. The
+    # rates are still the deployment's VAT_RATES (a dated, append-only table).
+    rows = sorted(
+        (parse_date(str(start)), Decimal(str(rate)))
+        for start, rate in getattr(settings, 'VAT_RATES', [('2018-01-01', '0.05')])
+    )
+    starts = [start for start, _rate in rows]
+    rates = [rate for _start, rate in rows]
+
+    def compute(amount, day):
+        rate = rates[max(bisect_right(starts, day) - 1, 0)]
+        amount = Decimal(str(amount))
+        vat_amount = (amount * rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+        return vat_amount, amount + vat_amount
+
+    return compute
+
+
+def backfill_vat(apps, schema_editor):
+    compute = vat_calculator()
+    Invoice = apps.get_model('invoices', 'Invoice')
+    RevenueRollup = apps.get_model('invoices', 'RevenueRollup')
+
+    last_pk = 0
+    while True:
+        batch = list(Invoice.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'amount', 'date')[:BATCH_SIZE])
+        if not batch:
+            break
+        for invoice in batch:
+            invoice.vat_amount, invoice.total_with_vat = compute(invoice.amount, invoice.date)
+        Invoice.objects.bulk_update(batch, ['vat_amount', 'total_with_vat'])
+        last_pk = batch[-1].pk
+
+    for period, bucket in (('day', F('date')), ('month', TruncMonth('date'))):
+        for fields in (['bucket'], ['bucket', 'client_name']):
+            rows = Invoice.objects.annotate(bucket=bucket).values(*fields).annotate(vat=Sum('vat_amount')).order_by()
+            for row in rows:
+                period_start = row['bucket'].date() if hasattr(row['bucket'], 'date') else row['bucket']
+                RevenueRollup.objects.filter(
+                    period=period, period_start=period_start, client_name=row.get('client_name', ''),
+                ).update(vat_amount=row['vat'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0010_invoice_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='total_with_vat',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='vat_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='revenuerollup',
+            name='vat_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16),
+        ),
+        migrations.RunPython(backfill_vat, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.24 on 2026-10-17 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_stored_vat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('invoice', 'Invoice'), ('quotation', 'Quotation')], max_length=20)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_pdfs', to='invoices.invoice')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('invoice', 'kind'), name='unique_archived_pdf')],
+            },
+        ),
+    ]
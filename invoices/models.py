@@ -9,19 +9,137 @@ class Invoice(models.Model):
     address = models.TextField()
     mobile_number = models.CharField(max_length=20)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Derived from amount and the VAT rate on date (invoices/vat.py) on every save
+    vat_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total_with_vat = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     work_description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # The list is ordered newest first and filtered by date; the MySQL
+        # FULLTEXT index used by search is created in migration 0010.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='invoice_created_idx'),
+            models.Index(fields=['date', 'created_at'], name='invoice_date_created_idx'),
+            # Delta reads of recently written rows (client_directory.sync)
+            models.Index(fields=['updated_at'], name='invoice_updated_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            # Get the last invoice number, or start from 9999 (so first one is 10000)
-            last_invoice = Invoice.objects.filter(invoice_number__isnull=False).order_by('invoice_number').last()
-            if last_invoice:
-                self.invoice_number = last_invoice.invoice_number + 1
-            else:
-                self.invoice_number = 10000
-        super().save(*args, **kwargs)
+        from . import vat
+
+        vat.apply(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'date'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'vat_amount', 'total_with_vat'}
+
+        if self.invoice_number:
+            return super().save(*args, **kwargs)
+
+        from .numbering import save_with_invoice_number
+        save_with_invoice_number(self, super().save, *args, **kwargs)
 
     def __str__(self):
         return f"{self.reference_no} - {self.client_name}"
 
+
+
+class InvoiceSequence(models.Model):
+    # One counter row per sequence; see invoices/numbering.py.
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class RenderJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('invoice', 'Invoice'),
+        ('quotation', 'Quotation'),
+    ]
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='render_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    content_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['invoice', 'kind', 'content_key'], name='unique_render_job'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.invoice_id} ({self.status})"
+
+
+class RevenueRollup(models.Model):
+    PERIOD_DAY = 'day'
+    PERIOD_MONTH = 'month'
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, 'Day'),
+        (PERIOD_MONTH, 'Month'),
+    ]
+    # Rows with an empty client_name hold the totals across all clients.
+    ALL_CLIENTS = ''
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    client_name = models.CharField(max_length=255, blank=True)
+    invoice_count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    vat_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'client_name', 'period_start'], name='unique_revenue_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start} {self.client_name or 'all clients'}: {self.amount}"
+
+
+class ArchivedPDF(models.Model):
+    """A finalised invoice's frozen PDF; the bytes live in the blob store (invoices/archive.py)."""
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='archived_pdfs')
+    kind = models.CharField(max_length=20, choices=RenderJob.KIND_CHOICES)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['invoice', 'kind'], name='unique_archived_pdf'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.invoice_id} ({self.sha256[:12]})"
+
+
+class CacheGeneration(models.Model):
+    # Version counters the list and analytics caches key on; see invoices/generations.py.
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,119 @@
+"""
+Cursor pagination for the invoice list.
+
+Pages are addressed by the (created_at, id) of the row just before or after
+them rather than by page number, so fetching any page is one index range scan
+of ``page_size + 1`` rows on ``invoice_created_idx`` no matter how deep it is.
+The total shown alongside is approximate: table statistics when the list is
+unfiltered on MySQL, otherwise a count capped at ``COUNT_CAP``.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Q
+
+COUNT_CAP = 1000
+
+
+def encode_cursor(invoice):
+    raw = f"{invoice.created_at.isoformat()}|{invoice.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Return ``(created_at, id)`` for a cursor string, or None if it is malformed."""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def table_row_estimate(model):
+    # InnoDB keeps an estimated row count; reading it avoids a full COUNT(*).
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class CursorPage:
+    """One page of a queryset ordered by ``(-created_at, -id)``; iterates like a ``Page``."""
+
+    def __init__(self, queryset, page_size=10, after=None, before=None, filtered=True):
+        self.queryset = queryset
+        self.page_size = page_size
+        self.filtered = filtered
+        after, before = decode_cursor(after), decode_cursor(before)
+
+        if before:
+            created_at, pk = before
+            rows = list(
+                queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:page_size + 1]
+            )
+            self.has_previous = len(rows) > page_size
+            self.has_next = True
+            self.object_list = rows[:page_size][::-1]
+        else:
+            qs = queryset.order_by('-created_at', '-id')
+            if after:
+                created_at, pk = after
+                qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            rows = list(qs[:page_size + 1])
+            self.has_previous = after is not None
+            self.has_next = len(rows) > page_size
+            self.object_list = rows[:page_size]
+
+        if not self.object_list and (after or before):
+            # Stale cursor past either end: show the first page instead.
+            self.__init__(queryset, page_size, filtered=filtered)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous else None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    @property
+    def approximate_count(self):
+        """``(count, is_exact)`` for the whole filtered list."""
+        if not hasattr(self, '_count'):
+            estimate = None if self.filtered else table_row_estimate(self.queryset.model)
+            if estimate is not None:
+                self._count = (estimate, False)
+            else:
+                count = self.queryset.order_by()[:COUNT_CAP + 1].count()
+                self._count = (min(count, COUNT_CAP), count <= COUNT_CAP)
+        return self._count
+
+    @property
+    def count_label(self):
+        count, exact = self.approximate_count
+        if exact:
+            return f"{count:,} invoice{'' if count == 1 else 's'}"
+        if self.filtered:
+            return f"{count:,}+ invoices"
+        return f"About {count:,} invoices"
@@ -0,0 +1,114 @@
+"""
+Process-wide PDF assets: compiled templates and in-memory images.
+
+Templates reference images as ``asset:<file name>``; ``link_callback`` hands
+pisa a ``data:`` URI built once from ``settings.PDF_ASSETS_DIR``, so renders
+never touch the filesystem for the logo / stamp. Images are downscaled to
+``PDF_ASSET_MAX_PX`` on load, since reportlab re-encodes every embedded image
+on every render. ``warm()`` runs from ``InvoicesConfig.ready`` so the first
+request pays no setup cost, unless ``PDF_ASSETS_WARM`` is off (serverless
+cold starts), in which case the first render loads everything.
+"""
+
+import base64
+import hashlib
+import mimetypes
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+
+ASSET_SCHEME = "asset:"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif"}
+
+
+class PDFAssets:
+    def __init__(self, asset_dir, template_names, max_px):
+        self.asset_dir = Path(asset_dir)
+        self.max_px = max_px
+        self.template_names = template_names
+        self.templates = {}
+        self.images = {}
+        self.version = ""
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        if self._loaded:
+            return self
+        with self._lock:
+            if self._loaded:
+                return self
+            digest = hashlib.sha256()
+            images = {}
+            for path in sorted(self.asset_dir.glob("*")):
+                if path.suffix.lower() not in IMAGE_SUFFIXES:
+                    continue
+                data = self._prepare_image(path)
+                digest.update(path.name.encode())
+                digest.update(data)
+                mime = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+                images[path.name] = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+            self.images = images
+            self.version = digest.hexdigest()[:16]
+            self.templates = {kind: get_template(name) for kind, name in self.template_names.items()}
+
+            # Write binary streams instead of ASCII85-encoding every image in
+            # pure Python; the output is smaller as well.
+            from reportlab import rl_config
+            rl_config.useA85 = 0
+            # Fixed creation date and document ID: the same HTML always gives
+            # the same bytes, which the archive's blob store deduplicates on.
+            rl_config.invariant = int(getattr(settings, "PDF_INVARIANT", True))
+
+            self._loaded = True
+        return self
+
+    def _prepare_image(self, path):
+        data = path.read_bytes()
+        if not self.max_px:
+            return data
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as image:
+            if max(image.size) <= self.max_px:
+                return data
+            image.thumbnail((self.max_px, self.max_px))
+            buffer = BytesIO()
+            image.save(buffer, format=image.format or "PNG")
+        return buffer.getvalue()
+
+    def template(self, kind):
+        return self.load().templates[kind]
+
+    def link_callback(self, uri, rel):
+        if uri.startswith(ASSET_SCHEME):
+            return self.load().images.get(uri[len(ASSET_SCHEME):], uri)
+        return uri
+
+
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def get_pdf_assets():
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                from .rendering import TEMPLATES
+
+                asset_dir = getattr(settings, "PDF_ASSETS_DIR", Path(settings.BASE_DIR) / "billing_system" / "media" / "images")
+                max_px = getattr(settings, "PDF_ASSET_MAX_PX", 400)
+                _assets = PDFAssets(asset_dir, TEMPLATES, max_px)
+    return _assets
+
+
+def link_callback(uri, rel):
+    return get_pdf_assets().link_callback(uri, rel)
+
+
+def warm():
+    return get_pdf_assets().load()
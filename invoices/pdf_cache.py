@@ -0,0 +1,157 @@
+"""
+Content-addressed cache for rendered invoice / quotation PDFs.
+
+Entries are keyed on a digest of the rendered HTML, the template name and the
+VAT rate, so any change to the invoice row, the template or the rate produces
+a new key. Two stores are available, selected by ``settings.PDF_CACHE``:
+
+* ``disk``   - one file per entry under ``LOCATION/<invoice pk>/``, evicted
+               least-recently-used once the directory grows past ``MAX_BYTES``.
+               Each process keeps a running size estimate (the size found by
+               its last scan plus what it wrote since) and only scans the
+               directory when that passes ``MAX_BYTES``; a scan evicts down
+               to ``LOW_WATER`` of it, so scans stay rare.
+* ``django`` - any configured Django cache backend (``CACHE_ALIAS``); eviction
+               is left to the backend (e.g. ``MAX_ENTRIES`` on LocMemCache).
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULTS = {
+    "BACKEND": "disk",
+    "LOCATION": Path(tempfile.gettempdir()) / "billing_pdf_cache",
+    "MAX_BYTES": 256 * 1024 * 1024,
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": None,
+}
+
+# Eviction frees space down to this fraction of MAX_BYTES.
+LOW_WATER = 0.9
+
+
+def make_key(template_name, html, vat_rate):
+    digest = hashlib.sha256()
+    digest.update(template_name.encode())
+    digest.update(b"\0")
+    digest.update(str(vat_rate).encode())
+    digest.update(b"\0")
+    digest.update(html.encode())
+    return digest.hexdigest()
+
+
+class DiskPDFCache:
+    def __init__(self, location, max_bytes):
+        self.location = Path(location)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._estimated_bytes = None  # unknown until the first scan
+
+    def _path(self, invoice_pk, key):
+        return self.location / str(invoice_pk) / f"{key}.pdf"
+
+    def get(self, invoice_pk, key):
+        path = self._path(invoice_pk, key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # Bump mtime so eviction treats this entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, invoice_pk, key, data):
+        path = self._path(invoice_pk, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._estimated_bytes is not None:
+                self._estimated_bytes += len(data)
+                if self._estimated_bytes <= self.max_bytes:
+                    return
+            self._evict()
+
+    def invalidate(self, invoice_pk):
+        shutil.rmtree(self.location / str(invoice_pk), ignore_errors=True)
+
+    def _evict(self):
+        # Called with the lock held. Scans the whole directory, so it also
+        # picks up entries written or invalidated by other processes.
+        entries = []
+        total = 0
+        for path in self.location.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total > self.max_bytes:
+            entries.sort()
+            target = self.max_bytes * LOW_WATER
+            for _mtime, size, path in entries:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= target:
+                    break
+        self._estimated_bytes = total
+
+
+class DjangoPDFCache:
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def _generation(self, invoice_pk):
+        return self.cache.get_or_set(f"pdf-gen:{invoice_pk}", 0, None)
+
+    def _key(self, invoice_pk, key):
+        return f"pdf:{invoice_pk}:{self._generation(invoice_pk)}:{key}"
+
+    def get(self, invoice_pk, key):
+        return self.cache.get(self._key(invoice_pk, key))
+
+    def set(self, invoice_pk, key, data):
+        self.cache.set(self._key(invoice_pk, key), data, self.timeout)
+
+    def invalidate(self, invoice_pk):
+        # Bumping the generation orphans every entry for this invoice; the
+        # backend reclaims them through its own eviction.
+        try:
+            self.cache.incr(f"pdf-gen:{invoice_pk}")
+        except ValueError:
+            self.cache.set(f"pdf-gen:{invoice_pk}", 1, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = {**DEFAULTS, **getattr(settings, "PDF_CACHE", {})}
+                if config["BACKEND"] == "django":
+                    _cache = DjangoPDFCache(config["CACHE_ALIAS"], config["TIMEOUT"])
+                else:
+                    _cache = DiskPDFCache(config["LOCATION"], config["MAX_BYTES"])
+    return _cache
@@ -0,0 +1,240 @@
+"""
+File-backed PDF rendering for documents too large to hold per request.
+
+Invoices whose work description is longer than
+``PDF_FILE_MODE["DESCRIPTION_CHARS"]`` (or any PDF requested with
+``?stream=1``) are rendered by ``render_pdf_file`` instead of ``html_to_pdf``:
+
+* The render runs in one of ``WORKERS`` pre-started processes, each with its
+  address space capped at ``MEMORY_LIMIT_MB`` above what it maps once warm,
+  so a runaway document fails that render instead of growing the web worker.
+  The workers are spawned, not forked, so they never inherit locks held by
+  the web worker's other threads. pisa writes the PDF straight to a temporary
+  file shared with the caller, and the view streams it out in chunks with
+  ``FileResponse``. The PDF bytes never sit in the web worker's memory.
+* Where ``resource`` or process pools are unavailable, the render runs
+  in-process into a ``SpooledTemporaryFile`` that moves to disk past
+  ``SPOOL_MAX_BYTES``; there the PDF does pass through this process.
+* PDFs with more than ``MAX_PAGES`` pages are refused.
+
+Every render reports its page count, counted from the file in chunks, and,
+when run in a worker, the worker's peak RSS during the render
+(``bench_pdf_memory`` prints both).
+"""
+
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .metrics import span
+from .pdf_assets import get_pdf_assets, link_callback
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+DEFAULTS = {
+    "DESCRIPTION_CHARS": 4000,
+    "MAX_PAGES": 40,
+    "MEMORY_LIMIT_MB": 512,
+    "SPOOL_MAX_BYTES": 2 * 1024 * 1024,
+    "WORKERS": 2,
+}
+
+# reportlab writes one uncompressed "/Type /Page" dictionary per page.
+PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# Longer than any PAGE_RE match, so one split across two chunks is still seen.
+PAGE_OVERLAP = 64
+CHUNK_SIZE = 64 * 1024
+
+
+class PDFLimitExceeded(Exception):
+    pass
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "PDF_FILE_MODE", {})}
+
+
+def wants_file_mode(request, invoice):
+    if request.GET.get("stream") == "1":
+        return True
+    return len(invoice.work_description or "") > config()["DESCRIPTION_CHARS"]
+
+
+def status_kb(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when "5" is written here.
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _vm_bytes():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def count_pages(fh):
+    """Pages in the PDF held in ``fh``, read from its start in chunks."""
+    fh.seek(0)
+    pages = 0
+    tail = b""
+    while True:
+        chunk = fh.read(CHUNK_SIZE)
+        data = tail + chunk
+        if not chunk:
+            return pages + len(PAGE_RE.findall(data))
+        # Matches starting in the last PAGE_OVERLAP bytes are counted with the next chunk.
+        cut = max(len(data) - PAGE_OVERLAP, 0)
+        pages += sum(1 for match in PAGE_RE.finditer(data) if match.start() < cut)
+        tail = data[cut:]
+
+
+def _write_pdf(html, fh):
+    """Render into ``fh``; returns the page count, or None if pisa failed."""
+    from xhtml2pdf import pisa
+
+    get_pdf_assets().load()
+    status = pisa.CreatePDF(html, dest=fh, link_callback=link_callback)
+    if status.err:
+        return None
+    fh.flush()
+    return count_pages(fh)
+
+
+# ================================
+# Render workers
+# ================================
+def _init_worker(memory_limit):
+    # A fresh interpreter: load Django and warm pisa and the assets before
+    # capping, so the cap only bounds what a render adds.
+    import django
+
+    django.setup()
+    from xhtml2pdf import pisa  # noqa: F401
+
+    get_pdf_assets().load()
+    vm_bytes = _vm_bytes()
+    if memory_limit and vm_bytes is not None:
+        limit = vm_bytes + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _render_to_path(html, path):
+    # Runs in a worker; the caller holds the file open and removes it.
+    can_reset = reset_peak_rss()
+    start_rss = status_kb("VmRSS") or 0
+    try:
+        with open(path, "w+b") as fh:
+            pages = _write_pdf(html, fh)
+        error = None if pages is not None else "PDF generation error"
+    except MemoryError:
+        pages = None
+        error = "PDF generation error: the document needs more memory than one render may use"
+    except Exception as exc:
+        pages = None
+        error = f"PDF generation error: {exc}"
+    # Without clear_refs the peak is the worker's lifetime peak.
+    peak_kb = status_kb("VmHWM") if can_reset else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"error": error, "pages": pages, "peak_rss_kb": peak_kb, "rss_growth_kb": max(peak_kb - start_rss, 0)}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_pool():
+    """The shared worker pool, or None where renders must stay in-process."""
+    global _pool
+    if resource is None:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = config()
+                try:
+                    _pool = ProcessPoolExecutor(
+                        max_workers=options["WORKERS"],
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(options["MEMORY_LIMIT_MB"] * 1024 * 1024,),
+                    )
+                except (OSError, NotImplementedError):
+                    return None
+    return _pool
+
+
+def _render_in_pool(pool, html):
+    global _pool
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    fh = os.fdopen(fd, "w+b")
+    try:
+        stats = pool.submit(_render_to_path, html, path).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time.
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        stats = {"error": "PDF generation error: the render process exited"}
+    finally:
+        # The open handle keeps the data; the name goes now.
+        os.unlink(path)
+    return fh, stats
+
+
+def render_pdf_file(html, max_pages=None, isolate=True):
+    """Render ``html`` to a temporary file; returns ``(file, stats)``.
+
+    The file is positioned at the start and removed once closed. Raises
+    ``PDFLimitExceeded`` if the render fails, runs out of its memory budget
+    or comes out longer than ``max_pages``.
+    """
+    options = config()
+    max_pages = options["MAX_PAGES"] if max_pages is None else max_pages
+    start = time.perf_counter()
+
+    with span("pdf"):
+        pool = render_pool() if isolate else None
+        if pool is not None:
+            fh, stats = _render_in_pool(pool, html)
+        else:
+            fh = tempfile.SpooledTemporaryFile(max_size=options["SPOOL_MAX_BYTES"])
+            pages = _write_pdf(html, fh)
+            stats = {"error": None if pages is not None else "PDF generation error", "pages": pages}
+
+    if stats["error"]:
+        fh.close()
+        raise PDFLimitExceeded(stats["error"])
+
+    stats["bytes"] = fh.seek(0, os.SEEK_END)
+    stats["seconds"] = time.perf_counter() - start
+    fh.seek(0)
+    if max_pages and stats["pages"] > max_pages:
+        fh.close()
+        raise PDFLimitExceeded(f"PDF generation error: {stats['pages']} pages is more than the {max_pages} allowed")
+    return fh, stats
@@ -0,0 +1,148 @@
+"""
+Eager PDF rendering after an invoice is saved.
+
+With ``settings.PDF_PRERENDER`` on, saving an invoice queues its invoice and
+quotation PDFs for a small pool of background threads, which render them into
+the PDF cache so the download link on the next page is a cache hit. The queue
+is bounded: when it is full the save does not wait, the work is dropped and
+the PDF is rendered on request as before. An invoice already waiting in the
+queue is not queued twice; the worker renders whatever the row holds when it
+gets to it.
+
+Only worth enabling on a long-lived process; on serverless hosts the threads
+may be frozen as soon as the response is sent.
+"""
+
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .models import Invoice
+from .pdf_cache import get_pdf_cache
+from .rendering import TEMPLATES, html_to_pdf, render_html
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "WORKERS": 2,
+    "QUEUE_SIZE": 16,
+}
+
+
+class PrerenderPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.stats = {"queued": 0, "dropped": 0, "rendered": 0, "cached": 0, "failed": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _count(self, outcome, n=1):
+        with self._lock:
+            self.stats[outcome] += n
+
+    def _start(self):
+        # Threads are started on first use so management commands and
+        # processes that never save an invoice don't carry them.
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"pdf-prerender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, invoice_pk):
+        """Queue ``invoice_pk`` without blocking; returns False if the work was dropped."""
+        with self._lock:
+            if invoice_pk in self._pending:
+                return True
+            self._pending.add(invoice_pk)
+        try:
+            self._queue.put_nowait(invoice_pk)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(invoice_pk)
+            self._count("dropped")
+            return False
+        self._count("queued")
+        if len(self._threads) < self.workers:
+            self._start()
+        return True
+
+    def _run(self):
+        while True:
+            invoice_pk = self._queue.get()
+            with self._lock:
+                self._pending.discard(invoice_pk)
+            try:
+                self.render(invoice_pk)
+            except Exception:
+                self._count("failed")
+                logger.exception("Pre-rendering PDFs for invoice %s failed", invoice_pk)
+            finally:
+                # Threads outside the request cycle have to return their
+                # connection themselves.
+                connections.close_all()
+                self._queue.task_done()
+
+    def render(self, invoice_pk):
+        close_old_connections()
+        invoice = Invoice.objects.filter(pk=invoice_pk).first()
+        if invoice is None:
+            return
+        cache = get_pdf_cache()
+        for kind in TEMPLATES:
+            html, key = render_html(invoice, kind)
+            if cache.get(invoice.pk, key) is not None:
+                self._count("cached")
+                continue
+            pdf = html_to_pdf(html)
+            if pdf is None:
+                self._count("failed")
+                continue
+            cache.set(invoice.pk, key, pdf)
+            self._count("rendered")
+
+    def join(self):
+        self._queue.join()
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "waiting": self._queue.qsize()}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "PDF_PRERENDER", {})}
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = config()
+                _pool = PrerenderPool(options["WORKERS"], options["QUEUE_SIZE"])
+    return _pool
+
+
+def enabled():
+    return bool(config()["ENABLED"])
+
+
+def prerender_stats():
+    return _pool.snapshot() if _pool is not None else {}
+
+
+def schedule(invoice_pk):
+    if enabled():
+        return get_pool().submit(invoice_pk)
+    return False
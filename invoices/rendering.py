@@ -0,0 +1,230 @@
+"""
+PDF rendering service: template context, HTML rendering, HTML -> PDF, and
+``render_many`` for rendering a batch of invoices through a worker pool.
+"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+
+from .amount_words import amount_in_words
+from .metrics import span
+from .pdf_assets import get_pdf_assets, link_callback
+from .models import Invoice
+from .pdf_cache import get_pdf_cache, make_key
+from .vat import rate_for
+
+TEMPLATES = {
+    "invoice": "invoices/pdf_template.html",
+    "quotation": "invoices/quotation_template.html",
+}
+
+
+# ================================
+# Helper: PDF template context
+# ================================
+def pdf_context(invoice):
+    # VAT and total are stored on the invoice (see vat.py).
+    return {
+        "invoice": invoice,
+        "vat_amount": invoice.vat_amount,
+        "total_with_vat": invoice.total_with_vat,
+        "amount_in_words": amount_in_words(invoice.total_with_vat),
+    }
+
+
+def pdf_filename(invoice, kind):
+    return f"{kind}_{invoice.reference_no}.pdf"
+
+
+def render_html(invoice, kind, assets=None):
+    assets = assets or get_pdf_assets()
+    html = assets.template(kind).render(pdf_context(invoice))
+    # Template identity includes the asset set, since images are not in the HTML.
+    return html, make_key(f"{TEMPLATES[kind]}@{assets.version}", html, rate_for(invoice.date))
+
+
+# ================================
+# Helper: HTML -> PDF bytes
+# ================================
+def html_to_pdf(html):
+    # Kept free of ORM access so it can run inside a worker process. pisa
+    # (with reportlab) is imported here, not at module load, so requests that
+    # never render a PDF don't pay for it on a cold start.
+    from xhtml2pdf import pisa
+
+    get_pdf_assets().load()  # sets reportlab options before the first render
+    buffer = BytesIO()
+    with span("pdf"):
+        pisa_status = pisa.CreatePDF(html, dest=buffer, link_callback=link_callback)
+    if pisa_status.err:
+        return None
+    return buffer.getvalue()
+
+
+# ================================
+# Helper: HTML -> PDF bytes, awaitable
+# ================================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pdf_executor():
+    # A fixed set of processes shared by the async views. pisa is pure Python,
+    # so rendering on threads would compete with the event loop for the GIL.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, "ASYNC_PDF_WORKERS", None) or os.cpu_count() or 1
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=workers)
+                except (OSError, NotImplementedError):
+                    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf")
+    return _executor
+
+
+async def html_to_pdf_async(html):
+    global _executor
+    executor = pdf_executor()
+    with span("pdf"):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, html_to_pdf, html)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time.
+            with _executor_lock:
+                if _executor is executor:
+                    _executor = None
+            return None
+
+
+# ================================
+# Batch rendering
+# ================================
+POOLS = ("process", "thread", "inline")
+# Invoices per archive lookup in a batch render.
+ARCHIVE_LOOKUP_CHUNK = 200
+
+
+def batch_workers():
+    return getattr(settings, "BULK_EXPORT_WORKERS", None) or os.cpu_count() or 1
+
+
+def make_pool(pool=None, workers=None):
+    """A new executor for a batch, or None to render inline."""
+    pool = pool or getattr(settings, "PDF_BATCH_POOL", "process")
+    if pool not in POOLS:
+        raise ValueError(f"Unknown PDF pool {pool!r}; expected one of {', '.join(POOLS)}.")
+    workers = workers or batch_workers()
+    if pool == "process":
+        try:
+            return ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            # Runtimes without working multiprocessing primitives render inline.
+            return None
+    if pool == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf")
+    return None
+
+
+def safe_html_to_pdf(html):
+    try:
+        return html_to_pdf(html)
+    except Exception:
+        return None
+
+
+def _with_archived(invoices, kind):
+    """Yield ``(invoice, archived_pdf_bytes or None)``, one archive query per chunk."""
+    from .archive import archived_digests, get_store  # archive imports this module
+
+    store = get_store()
+    invoices = iter(invoices)
+    while True:
+        chunk = list(islice(invoices, ARCHIVE_LOOKUP_CHUNK))
+        if not chunk:
+            return
+        digests = archived_digests(chunk, kind)
+        for invoice in chunk:
+            digest = digests.get(invoice.pk)
+            if digest is None:
+                yield invoice, None
+            else:
+                with store.open(digest) as fh:
+                    yield invoice, fh.read()
+
+
+def iter_render(invoices, kind, pool=None, workers=None):
+    """Yield ``(invoice, pdf_bytes)`` in input order; ``pdf_bytes`` is None on failure.
+
+    Finalised invoices come from the archive, exactly as issued. Cached PDFs
+    are reused and new ones stored. Only a small window of documents is in
+    flight, so any number of invoices can be streamed.
+    """
+    pdf_cache = get_pdf_cache()
+    # Loaded once, before any worker process is forked, so workers share it.
+    assets = get_pdf_assets().load()
+    workers = workers or batch_workers()
+    executor = make_pool(pool, workers)
+
+    pending = deque()
+    try:
+        for invoice, archived in _with_archived(invoices, kind):
+            if archived is not None:
+                key, pdf = None, archived
+            else:
+                html, key = render_html(invoice, kind, assets)
+                pdf = pdf_cache.get(invoice.pk, key)
+            if pdf is None:
+                if executor is not None:
+                    pdf = executor.submit(safe_html_to_pdf, html)
+                else:
+                    pdf = safe_html_to_pdf(html)
+                    if pdf is not None:
+                        pdf_cache.set(invoice.pk, key, pdf)
+            pending.append((invoice, key, pdf))
+
+            # Bound the number of rendered documents held at once.
+            while len(pending) > workers * 2:
+                yield _resolve(pending.popleft(), pdf_cache)
+
+        while pending:
+            yield _resolve(pending.popleft(), pdf_cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _resolve(entry, pdf_cache):
+    invoice, key, pdf = entry
+    if isinstance(pdf, Future):
+        try:
+            pdf = pdf.result()
+        except Exception:
+            pdf = None
+        if pdf is not None:
+            pdf_cache.set(invoice.pk, key, pdf)
+    return invoice, pdf
+
+
+def render_many(invoices, kind, pool=None, workers=None):
+    """Render ``kind`` PDFs for ``invoices`` (Invoice instances or pks).
+
+    Returns ``{pk: pdf_bytes or None}`` in input order. Pks are fetched with a
+    single ``in_bulk`` query; ones that don't exist are left out. ``pool`` is
+    "process", "thread" or "inline" (default ``settings.PDF_BATCH_POOL``).
+    """
+    invoices = list(invoices)
+    pks = [item for item in invoices if not isinstance(item, Invoice)]
+    if pks:
+        fetched = Invoice.objects.in_bulk(pks)
+        invoices = [item if isinstance(item, Invoice) else fetched.get(item) for item in invoices]
+    rows = [invoice for invoice in invoices if invoice is not None]
+    return {invoice.pk: pdf for invoice, pdf in iter_render(rows, kind, pool, workers)}
@@ -0,0 +1,72 @@
+"""
+Invoice list search.
+
+On MySQL the free-text box is answered through the ``invoice_search_ft``
+FULLTEXT index on (client_name, reference_no): every word of the query becomes
+a required prefix term (``+acme* +trad*``), and a purely numeric query also
+matches invoice numbers starting with those digits through the unique index.
+The original ``icontains`` condition is then applied to that candidate set
+only, so results match what the list has always shown, except for matches
+that start in the middle of a word.
+
+Words shorter than InnoDB's ``innodb_ft_min_token_size`` are not indexed, so
+queries made only of short words (and every query on other databases) use the
+plain ``icontains`` scan.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Invoice
+
+FULLTEXT_INDEX = 'invoice_search_ft'
+WORD_RE = re.compile(r'\w+')
+MAX_INVOICE_DIGITS = 10  # PositiveIntegerField
+
+
+def contains_q(query):
+    return (
+        Q(client_name__icontains=query) |
+        Q(invoice_number__icontains=query) |
+        Q(reference_no__icontains=query)
+    )
+
+
+def invoice_number_prefix_q(digits):
+    # "100" -> 100, 1000-1009, 10000-10099, ... : ranges the unique index can seek.
+    q = Q()
+    base = int(digits)
+    for extra in range(MAX_INVOICE_DIGITS - len(digits) + 1):
+        scale = 10 ** extra
+        q |= Q(invoice_number__gte=base * scale, invoice_number__lt=(base + 1) * scale)
+    return q
+
+
+def fulltext_q(terms):
+    table = connection.ops.quote_name(Invoice._meta.db_table)
+    boolean_query = ' '.join(f'+{term}*' for term in terms)
+    return Q(pk__in=RawSQL(
+        f"SELECT id FROM {table} WHERE MATCH (client_name, reference_no) AGAINST (%s IN BOOLEAN MODE)",
+        [boolean_query],
+    ))
+
+
+def search_invoices(qs, query):
+    query = query.strip()
+    if not query:
+        return qs
+
+    if connection.vendor == 'mysql':
+        min_token = getattr(settings, 'INVOICE_SEARCH_MIN_TOKEN', 3)
+        terms = [term for term in WORD_RE.findall(query) if len(term) >= min_token]
+        if terms:
+            candidates = fulltext_q(terms)
+            if query.isdigit() and len(query) <= MAX_INVOICE_DIGITS:
+                candidates |= invoice_number_prefix_q(query)
+            return qs.filter(candidates).filter(contains_q(query))
+
+    return qs.filter(contains_q(query))
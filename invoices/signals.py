@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import list_cache, prerender
+from .analytics import apply_change, apply_invoice, rollup_state
+from .archive import check_editable
+from .client_directory import get_directory, normalize
+from .models import Invoice
+from .pdf_cache import get_pdf_cache
+
+
+# ================================
+# Finalised invoices
+# ================================
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_delete, sender=Invoice)
+def protect_finalised_invoice(sender, instance, raw=False, **kwargs):
+    # Covers every path (forms, admin, queryset deletes); the archived PDFs
+    # and the rollups must keep agreeing.
+    if not raw:
+        check_editable(instance)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_invoice_pdfs(sender, instance, **kwargs):
+    get_pdf_cache().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def bump_invoice_table_version(sender, instance, raw=False, **kwargs):
+    # In the write's transaction, so no process can see the new rows under
+    # the old version.
+    if not raw:
+        list_cache.bump_version()
+
+
+@receiver(post_save, sender=Invoice)
+def add_to_client_directory(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # A rename takes this invoice away from the old name; read it now, as
+    # the rollup receiver below replaces the remembered state.
+    previous = getattr(instance, '_rollup_previous', None)
+    renamed_from = previous[1] if previous and normalize(previous[1]) != normalize(instance.client_name) else None
+
+    def update():
+        directory = get_directory()
+        if renamed_from is not None:
+            directory.remove_invoice(instance.pk, renamed_from)
+        directory.add_invoice(instance)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Invoice)
+def remove_from_client_directory(sender, instance, **kwargs):
+    # Read now: the delete clears instance.pk before the transaction commits.
+    pk, client_name = instance.pk, instance.client_name
+    transaction.on_commit(lambda: get_directory().remove_invoice(pk, client_name))
+
+
+@receiver(post_save, sender=Invoice)
+def prerender_invoice_pdfs(sender, instance, raw=False, **kwargs):
+    if raw or not prerender.enabled():
+        return
+    # After commit, so the worker reads the saved row.
+    pk = instance.pk
+    transaction.on_commit(lambda: prerender.schedule(pk))
+
+
+# ================================
+# Revenue rollups
+# ================================
+@receiver(pre_save, sender=Invoice)
+def remember_rollup_state(sender, instance, raw=False, **kwargs):
+    # Also read by add_to_client_directory, for renames.
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    previous = Invoice.objects.filter(pk=instance.pk).values_list(
+        'date', 'client_name', 'amount', 'vat_amount',
+    ).first()
+    if previous is not None:
+        instance._rollup_previous = previous
+
+
+@receiver(post_save, sender=Invoice)
+def update_revenue_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = rollup_state(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_change(previous, current)
+    else:
+        apply_invoice(*current)
+    instance._rollup_previous = current
+
+
+@receiver(post_delete, sender=Invoice)
+def remove_from_revenue_rollups(sender, instance, **kwargs):
+    apply_invoice(*rollup_state(instance), sign=-1)
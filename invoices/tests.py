@@ -1,3 +1,655 @@
-from django.test import TestCase
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+import zipfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, analytics_cache, client_directory
+from .amount_words import amount_in_words
+from .archive import InvoiceFinalised, record
+from .analytics import resolve_period, to_date
+from .bulk_export import ExportProgress, get_progress, stream_merged_pdf, stream_zip
+from .client_directory import ClientDirectory, search_clients
+from .csv_export import analytics_csv_rows
+from .importer import find_encoding_error, import_file
+from .models import Invoice, RevenueRollup
+from .numbering import FIRST_NUMBER, next_invoice_number, reserve
+from .pdf_spool import CHUNK_SIZE, PDFLimitExceeded, config, count_pages, render_pdf_file, render_pool
+from .rendering import html_to_pdf, render_html, render_many
+
+
+def make_invoice(**fields):
+    values = {
+        "client_name": "Acme Trading LLC",
+        "reference_no": "REF-1",
+        "date": date(2024, 3, 15),
+        "subject": "Ductwork",
+        "address": "Dubai, UAE",
+        "mobile_number": "0501234567",
+        "amount": 100,
+        "work_description": "Supply and install.",
+        **fields,
+    }
+    return Invoice.objects.create(**values)
+
+
+# ================================
+# Invoice numbers
+# ================================
+class InvoiceNumberTests(TestCase):
+    def test_numbers_start_at_first_number_and_follow_on(self):
+        first = make_invoice()
+        second = make_invoice()
+        self.assertEqual(first.invoice_number, FIRST_NUMBER)
+        self.assertEqual(second.invoice_number, FIRST_NUMBER + 1)
+
+    def test_reserve_returns_a_consecutive_block(self):
+        make_invoice()
+        block = reserve(5)
+        self.assertEqual(list(block), list(range(FIRST_NUMBER + 1, FIRST_NUMBER + 6)))
+        self.assertEqual(next_invoice_number(), FIRST_NUMBER + 6)
+
+    def test_number_written_outside_the_sequence_is_skipped(self):
+        make_invoice()
+        Invoice.objects.filter(invoice_number=FIRST_NUMBER).update(invoice_number=FIRST_NUMBER + 1)
+        self.assertEqual(make_invoice().invoice_number, FIRST_NUMBER + 2)
+
+
+class ConcurrentInvoiceNumberTests(TransactionTestCase):
+    WORKERS = 8
+    PER_WORKER = 10
+
+    def test_concurrent_creates_get_unique_gapless_numbers(self):
+        numbers = []
+        errors = []
+        lock = threading.Lock()
+        gate = threading.Barrier(self.WORKERS)
+
+        def worker(index):
+            try:
+                gate.wait()
+                for i in range(self.PER_WORKER):
+                    invoice = make_invoice(reference_no=f"STRESS-{index}-{i}")
+                    with lock:
+                        numbers.append(invoice.invoice_number)
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stored = sorted(Invoice.objects.values_list("invoice_number", flat=True))
+        self.assertEqual(sorted(numbers), stored)
+        self.assertEqual(stored, list(range(FIRST_NUMBER, FIRST_NUMBER + self.WORKERS * self.PER_WORKER)))
+
+
+# ================================
+# Import
+# ================================
+CSV_HEADER = "client_name,reference_no,date,subject,address,mobile_number,amount,work_description\n"
+CSV_ROW = "Acme Trading LLC,REF-{n},2024-03-15,Ductwork,Dubai,0501234567,100,Supply and install.\n"
+
+
+class ImportTests(TestCase):
+    def csv(self, rows, bom=False):
+        text = CSV_HEADER + "".join(CSV_ROW.format(n=n) for n in range(rows))
+        return (b"\xef\xbb\xbf" if bom else b"") + text.encode()
+
+    def test_excel_utf8_file_with_a_bom_imports(self):
+        report = import_file(BytesIO(self.csv(3, bom=True)), "csv")
+        self.assertEqual((report.created, report.errors), (3, []))
+        self.assertEqual(Invoice.objects.filter(client_name="Acme Trading LLC").count(), 3)
+
+    def test_encoding_error_position_is_counted_from_the_file_start(self):
+        self.assertEqual(find_encoding_error(BytesIO(b"\xef\xbb\xbfab\nc\xff\n"))[0], 2)
+        self.assertIn("0xff", find_encoding_error(BytesIO(b"\xef\xbb\xbfab\nc\xff\n"))[1])
+        self.assertEqual(find_encoding_error(BytesIO(b"ab\nc\xff\n"))[0], 2)
+        self.assertIsNone(find_encoding_error(BytesIO("\ufeffab\ncaf\u00e9\n".encode())))
+
+    def test_character_split_across_chunks(self):
+        data = self.csv(1, bom=True) + "Caf\u00e9 Noir\n".encode() + b"Caf\xe9\n"
+        for chunk_size in (1, 2, 3, 5, 64):
+            with self.subTest(chunk_size=chunk_size), mock.patch("invoices.importer.CHECK_CHUNK_SIZE", chunk_size):
+                self.assertEqual(find_encoding_error(BytesIO(data))[0], 4)
+
+    def test_batch_takes_locks_in_the_save_signal_order(self):
+        calls = []
+        with mock.patch("invoices.importer.list_cache.bump_version", side_effect=lambda: calls.append("table")), \
+                mock.patch("invoices.importer.apply_invoices", side_effect=lambda invoices: calls.append("rollups")):
+            import_file(BytesIO(self.csv(2)), "csv")
+        with mock.patch("invoices.signals.list_cache.bump_version", side_effect=lambda: calls.append("table")), \
+                mock.patch("invoices.signals.apply_invoice", side_effect=lambda *args, **kwargs: calls.append("rollups")):
+            make_invoice()
+        self.assertEqual(calls, ["table", "rollups", "table", "rollups"])
+
+    def test_latin1_file_is_rejected_before_anything_is_written(self):
+        data = self.csv(3) + CSV_ROW.format(n="caf\u00e9").encode("latin-1")
+        report = import_file(BytesIO(data), "csv", batch_size=1)
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.errors[0][0], 5)
+        self.assertFalse(Invoice.objects.exists())
+
+
+# ================================
+# Amounts in words
+# ================================
+def reference_words(value):
+    # Built straight from num2words with exact cents.
+    from num2words import num2words
+
+    cents = int((abs(value) * 100).to_integral_value())
+    dirhams, fils = divmod(cents, 100)
+    words = num2words(dirhams).replace(",", "") + " Dirhams"
+    if fils:
+        words += " and " + num2words(fils).replace(",", "") + " Fils"
+    if value < 0:
+        words = "minus " + words
+    return words + " Only"
+
+
+def random_amount(rng):
+    places = rng.choice((0, 1, 2, 3, 4))
+    whole = rng.choice((rng.randint(0, 999), rng.randint(1000, 99999), rng.randint(100000, 99999999)))
+    if not places:
+        return Decimal(whole)
+    return Decimal(f"{whole}.{rng.randint(0, 10 ** places - 1):0{places}d}")
+
+
+class AmountInWordsTests(TestCase):
+    EDGE_CASES = (
+        "0", "0.01", "0.99", "1", "1.005", "1.015", "99.995", "100", "1000000.50",
+        "9999999.99", "-5.25", "12345.6", "0.004",
+    )
+    SAMPLES = 2000
+
+    def amounts(self):
+        rng = random.Random(1)
+        return [Decimal(v) for v in self.EDGE_CASES] + [random_amount(rng) for _ in range(self.SAMPLES)]
+
+    def test_known_amounts(self):
+        self.assertEqual(amount_in_words(Decimal("0")), "zero Dirhams Only")
+        self.assertEqual(amount_in_words(Decimal("105.05")), "one hundred and five Dirhams and five Fils Only")
+        self.assertEqual(amount_in_words(Decimal("-5.25")), "minus five Dirhams and twenty-five Fils Only")
+
+    def test_matches_num2words(self):
+        for value in self.amounts():
+            with self.subTest(value=value):
+                self.assertEqual(amount_in_words(value), reference_words(round(value, 2)))
+
+    def test_floats_match_decimals(self):
+        for value in self.amounts():
+            if value != round(value, 2):
+                continue  # a float cannot hold the third place exactly
+            with self.subTest(value=value):
+                self.assertEqual(amount_in_words(float(value)), reference_words(value))
+
+    def test_unparseable_amount_is_printed_as_is(self):
+        self.assertEqual(amount_in_words("n/a"), "n/a AED")
+
+
+# ================================
+# Revenue rollups
+# ================================
+class RevenueRollupTests(TestCase):
+    def rollups(self):
+        fields = ("period", "period_start", "client_name", "amount", "invoice_count")
+        return sorted(RevenueRollup.objects.values_list(*fields))
+
+    def test_writes_keep_rollups_equal_to_a_rebuild(self):
+        first = make_invoice(client_name="Bravo", amount=100)
+        second = make_invoice(client_name="Acme", date=date(2024, 4, 1), amount=250)
+        second.client_name, second.date, second.amount = "Bravo", date(2024, 3, 15), 300
+        second.save()
+        first.delete()
+        incremental = self.rollups()
+        analytics.rebuild()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_rows_are_adjusted_in_sorted_order(self):
+        invoices = [
+            Invoice(date=date(2024, 5, 2), client_name="Zeta", amount=10, vat_amount=Decimal("0.50")),
+            Invoice(date=date(2024, 1, 9), client_name="Acme", amount=20, vat_amount=Decimal("1.00")),
+        ]
+        calls = []
+        with mock.patch.object(analytics, "_adjust", side_effect=lambda *args: calls.append(args[:3])):
+            analytics.apply_invoices(invoices)
+            analytics.apply_change(
+                (date(2024, 5, 2), "Zeta", 10, Decimal("0.50")), (date(2024, 1, 9), "Acme", 10, Decimal("0.50")),
+            )
+        batch, change = calls[:8], calls[8:]
+        self.assertEqual(batch, sorted(batch))
+        self.assertEqual(change, sorted(change))
+        self.assertEqual(len(change), 8)
+
+
+# ================================
+# Cold start
+# ================================
+class ColdImportTests(TestCase):
+    RUNS = 3
+
+    def cold_import(self):
+        from .management.commands.profile_imports import TIMING_SCRIPT
+
+        env = dict(os.environ, PDF_ASSETS_WARM="0")
+        result = subprocess.run(
+            [sys.executable, "-c", TIMING_SCRIPT], capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        elapsed, loaded = result.stdout.strip().splitlines()[-1].partition(" ")[::2]
+        return float(elapsed), loaded
+
+    def test_startup_does_not_import_pdf_modules(self):
+        _elapsed, loaded = self.cold_import()
+        self.assertEqual(loaded, "", f"PDF-only modules imported at startup: {loaded}")
+
+    def test_cold_import_is_within_budget(self):
+        budget = getattr(settings, "IMPORT_TIME_BUDGET_MS", 600)
+        median = statistics.median(self.cold_import()[0] for _ in range(self.RUNS))
+        self.assertLessEqual(median, budget, f"cold import {median:.1f} ms is over the {budget} ms budget")
+
+
+# ================================
+# Query counts
+# ================================
+class QueryCountTests(TestCase):
+    # Counts include the session and user lookups made by the auth
+    # middleware (2 queries) and the cache generation read (1 query).
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        for day in range(1, 26):
+            make_invoice(client_name=f"Client {day % 5}", date=date(2024, 1 + day % 3, day), amount=100 * day)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # Create the generation counters, so the counts below are the steady state.
+        self.client.get(reverse("analytics"), {"period": "this_year"})
+        self.client.get(reverse("analytics"), {"date_from": "2024-01-15", "date_to": "2024-03-10"})
+        self.client.get(reverse("invoice_list"), HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def test_analytics_cold_cache(self):
+        analytics_cache.invalidate_all()
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("analytics"), {"period": "this_year"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_analytics_cached(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("analytics"), {"period": "this_year"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_analytics_custom_range(self):
+        analytics_cache.invalidate_all()
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("analytics"), {"date_from": "2024-01-15", "date_to": "2024-03-10"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_analytics_csv_summary(self):
+        # The summary block, up to where the detail rows start (those are
+        # read in keyset chunks, so their count follows the data).
+        analytics_cache.invalidate_all()
+        date_from, date_to = resolve_period("this_month", "", "", timezone.now().date())
+        with self.assertNumQueries(2):
+            for row in analytics_csv_rows("this_month", date_from, date_to, to_date(date_from), to_date(date_to)):
+                if row == ["DETAILED INVOICE DATA"]:
+                    break
+
+    def test_list_page(self):
+        # One page of rows plus the result count (an estimate, or capped at COUNT_CAP).
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("invoice_list"))
+        self.assertEqual(len(response.context["invoices"]), 10)
+
+    def test_list_table_partial(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                reverse("invoice_list"), {"search": "Client 1"}, HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+            )
+        self.assertContains(response, "Client 1")
+
+    def test_list_table_partial_cached(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("invoice_list"), HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_table_partial_not_modified(self):
+        etag = self.client.get(reverse("invoice_list"), HTTP_X_REQUESTED_WITH="XMLHttpRequest")["ETag"]
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("invoice_list"), HTTP_X_REQUESTED_WITH="XMLHttpRequest", HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_invoice_write_changes_table_etag(self):
+        url = reverse("invoice_list")
+        before = self.client.get(url, HTTP_X_REQUESTED_WITH="XMLHttpRequest")["ETag"]
+        make_invoice(client_name="Late Client")
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH="XMLHttpRequest", HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Late Client")
+
+
+# ================================
+# File-mode PDFs
+# ================================
+def long_description(lines):
+    return "\n".join(
+        f"{n}. Supply, install and test ductwork with brackets and insulation as per drawing M-{n:03d}."
+        for n in range(1, lines + 1)
+    )
+
+
+class CountPagesTests(TestCase):
+    def test_counts_page_objects_split_across_chunks(self):
+        data = bytearray(b"%PDF-1.4 /Type /Pages /Count 4 " + b" " * (4 * CHUNK_SIZE))
+        for chunk in range(1, 5):
+            offset = chunk * CHUNK_SIZE - 5  # "/Type /Page" straddles the chunk boundary
+            data[offset:offset + 11] = b"/Type /Page"
+        self.assertEqual(count_pages(BytesIO(bytes(data))), 4)
+
+    def test_pages_dictionary_is_not_a_page(self):
+        self.assertEqual(count_pages(BytesIO(b"<< /Type /Pages >> << /Type /Page >> << /Type/Page>>")), 2)
+
+
+class RenderPDFFileTests(TestCase):
+    LONG_LINES = 150
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        cls.short = make_invoice()
+        cls.long = make_invoice(work_description=long_description(cls.LONG_LINES))
+
+    def html(self, invoice):
+        return render_html(invoice, "invoice")[0]
+
+    def test_renders_to_a_file_at_its_start(self):
+        pdf_file, stats = render_pdf_file(self.html(self.short), isolate=False)
+        with pdf_file:
+            self.assertEqual(pdf_file.read(5), b"%PDF-")
+        self.assertEqual(stats["pages"], 1)
+        self.assertGreater(stats["bytes"], 0)
+
+    def test_refuses_pdf_over_the_page_limit(self):
+        with self.assertRaisesMessage(PDFLimitExceeded, "allowed"):
+            render_pdf_file(self.html(self.long), max_pages=1, isolate=False)
+
+    def test_worker_render_matches_in_process_render(self):
+        if render_pool() is None:
+            self.skipTest("no render workers on this platform")
+        html = self.html(self.long)
+        local_file, local = render_pdf_file(html, max_pages=0, isolate=False)
+        local_file.close()
+        pdf_file, stats = render_pdf_file(html, max_pages=0)
+        with pdf_file:
+            self.assertEqual(pdf_file.read(5), b"%PDF-")
+        self.assertGreater(stats["pages"], 1)
+        self.assertEqual(stats["pages"], local["pages"])
+        with self.assertRaisesMessage(PDFLimitExceeded, "allowed"):
+            render_pdf_file(html, max_pages=stats["pages"] - 1)
+
+    def test_worker_reports_peak_rss_within_the_memory_limit(self):
+        if render_pool() is None:
+            self.skipTest("no render workers on this platform")
+        pdf_file, stats = render_pdf_file(self.html(self.long), max_pages=0)
+        pdf_file.close()
+        self.assertGreater(stats["peak_rss_kb"], 0)
+        self.assertGreater(stats["rss_growth_kb"], 0)
+        self.assertLessEqual(stats["rss_growth_kb"], stats["peak_rss_kb"])
+        self.assertLess(stats["rss_growth_kb"], config()["MEMORY_LIMIT_MB"] * 1024)
+
+    @override_settings(PDF_FILE_MODE={"DESCRIPTION_CHARS": 1000, "MAX_PAGES": 1})
+    def test_view_streams_long_invoices_and_enforces_the_limit(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("generate_pdf", args=[self.short.pk]), {"stream": "1"})
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(b"".join(response.streaming_content)[:5], b"%PDF-")
+        response = self.client.get(reverse("generate_pdf", args=[self.long.pk]))
+        self.assertContains(response, "more than the 1 allowed")
+
+
+# ================================
+# Bulk export
+# ================================
+class MergedPDFExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.invoice = make_invoice(work_description=long_description(120))
+        cls.pdf = html_to_pdf(render_html(cls.invoice, "invoice")[0])
+        cls.pages = count_pages(BytesIO(cls.pdf))
+
+    def merge(self, results):
+        return stream_merged_pdf(((self.invoice, pdf) for pdf in results), ExportProgress("", len(results)))
+
+    def peak_bytes(self, documents):
+        tracemalloc.start()
+        try:
+            for _chunk in self.merge([self.pdf] * documents):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_merged_pdf_holds_every_page(self):
+        from pypdf import PdfReader
+
+        merged = b"".join(self.merge([self.pdf, None, self.pdf, self.pdf]))
+        reader = PdfReader(BytesIO(merged), strict=True)
+        self.assertEqual(len(reader.pages), 3 * self.pages)
+        self.assertIn("Acme Trading LLC", reader.pages[self.pages].extract_text())
+
+    def test_memory_stays_flat_as_documents_are_added(self):
+        self.peak_bytes(5)  # pypdf's imports and caches
+        few, many = self.peak_bytes(20), self.peak_bytes(100)
+        # Holding the documents would add about a PDF's size per document;
+        # 80 more documents may cost less than four of them.
+        self.assertLess(many - few, 4 * len(self.pdf))
+
+
+class ExportProgressTests(TestCase):
+    def rendered(self, count, error_at=None):
+        invoice = Invoice(pk=1, invoice_number=FIRST_NUMBER)
+        for index in range(count):
+            if index == error_at:
+                raise RuntimeError("render pool went away")
+            yield invoice, None
+
+    def test_finished_export_is_done(self):
+        b"".join(stream_zip(self.rendered(3), "invoice", ExportProgress("t1", 3)))
+        self.assertEqual(get_progress("t1"), {"state": "done", "total": 3, "done": 3, "failed": 3})
+
+    def test_export_that_raises_is_failed(self):
+        with self.assertRaises(RuntimeError):
+            b"".join(stream_zip(self.rendered(3, error_at=2), "invoice", ExportProgress("t2", 3)))
+        self.assertEqual(get_progress("t2")["state"], "failed")
+
+    def test_abandoned_export_is_failed(self):
+        stream = stream_merged_pdf(self.rendered(3), ExportProgress("t3", 3))
+        next(stream)
+        stream.close()  # the client disconnected
+        self.assertEqual(get_progress("t3"), {"state": "failed", "total": 3, "done": 1, "failed": 1})
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+            "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"},
+        },
+        BULK_EXPORT_PROGRESS={"CACHE_ALIAS": "shared"},
+    )
+    def test_progress_goes_to_the_configured_cache(self):
+        ExportProgress("t4", 2).advance()
+        self.assertEqual(caches["shared"].get("bulk-export:t4")["done"], 1)
+        self.assertIsNone(caches["default"].get("bulk-export:t4"))
+
+
+# ================================
+# Finalised invoices
+# ================================
+class FinalisedInvoiceTests(TestCase):
+    ISSUED = b"%PDF-1.4 issued copy"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        cls.draft = make_invoice(client_name="Draft Client")
+        cls.issued = make_invoice(client_name="Issued Client")
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        archive_settings = override_settings(INVOICE_ARCHIVE={"LOCATION": location.name})
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        # Stands in for a PDF issued under an older template.
+        record(self.issued, "invoice", self.ISSUED)
+
+    def test_batch_renders_serve_the_archived_pdf(self):
+        pdfs = render_many([self.draft.pk, self.issued.pk], "invoice", pool="inline")
+        self.assertEqual(pdfs[self.issued.pk], self.ISSUED)
+        self.assertTrue(pdfs[self.draft.pk].startswith(b"%PDF-"))
+        self.assertNotEqual(pdfs[self.draft.pk], self.ISSUED)
+
+    @override_settings(PDF_BATCH_POOL="inline")
+    def test_bulk_export_zip_holds_the_archived_pdf(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("bulk_export"), {"format": "zip", "kind": "invoice"})
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertEqual(archive.read(f"invoice_{self.issued.invoice_number}.pdf"), self.ISSUED)
+
+    def test_finalised_invoice_cannot_change(self):
+        self.issued.amount = 1
+        with self.assertRaises(InvoiceFinalised):
+            self.issued.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(reverse("invoice_delete", args=[self.issued.pk])).status_code, 403)
+
+    def test_table_hides_actions_a_finalised_invoice_refuses(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("invoice_list"), HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        for name in ("invoice_update", "invoice_delete", "invoice_finalise"):
+            self.assertContains(response, reverse(name, args=[self.draft.pk]))
+            self.assertNotContains(response, reverse(name, args=[self.issued.pk]))
+        self.assertContains(response, reverse("generate_pdf", args=[self.issued.pk]))
+
+
+# ================================
+# Client directory
+# ================================
+class ClientDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        make_invoice(client_name="Acme Trading LLC", address="Old address", mobile_number="0500000001")
+        make_invoice(client_name="Acme Trading LLC", address="Deira, Dubai", mobile_number="0500000002")
+        make_invoice(client_name="acme builders", address="Sharjah")
+        make_invoice(client_name="Al Noor Contracting", address="Abu Dhabi")
+        make_invoice(client_name="Bravo Interiors", address="Ajman")
+
+    def setUp(self):
+        # A fresh module-level directory for every test.
+        patcher = mock.patch.object(client_directory, "_directory", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def directory(self, max_clients=100):
+        directory = ClientDirectory(max_clients, max_field_chars=300, sync_interval=30, rebuild_interval=3600)
+        directory.build()
+        return directory
+
+    def names(self, results):
+        return [result["name"] for result in results]
+
+    def test_prefix_lookup_is_case_and_whitespace_insensitive(self):
+        directory = self.directory()
+        self.assertEqual(self.names(directory.search("ac")), ["acme builders", "Acme Trading LLC"])
+        self.assertEqual(self.names(directory.search("  ACME   trad")), ["Acme Trading LLC"])
+        self.assertEqual(self.names(directory.search("a", limit=2)), ["acme builders", "Acme Trading LLC"])
+        self.assertEqual(directory.search("zz"), [])
+        self.assertEqual(directory.search("   "), [])
+
+    def test_entries_carry_the_latest_invoice_details(self):
+        directory = self.directory()
+        self.assertEqual(directory.search("acme t"), [
+            {"name": "Acme Trading LLC", "address": "Deira, Dubai", "mobile_number": "0500000002"},
+        ])
+        oldest = Invoice.objects.filter(client_name="Acme Trading LLC").order_by("pk").first()
+        directory.add((oldest.pk, oldest.client_name, oldest.address, oldest.mobile_number))
+        self.assertEqual(directory.search("acme t")[0]["address"], "Deira, Dubai")
+
+    def test_deleting_the_latest_invoice_falls_back_to_the_previous_one(self):
+        directory = self.directory()
+        latest = Invoice.objects.filter(client_name="Acme Trading LLC").latest("pk")
+        directory.remove_invoice(latest.pk, latest.client_name)
+        self.assertEqual(directory.search("acme t")[0]["address"], "Old address")
+        bravo = Invoice.objects.get(client_name="Bravo Interiors")
+        directory.remove_invoice(bravo.pk, bravo.client_name)
+        self.assertEqual(directory.search("bravo"), [])
+
+    def test_evicts_the_least_recently_invoiced_clients(self):
+        directory = self.directory(max_clients=4)
+        self.assertEqual(len(directory), 4)
+        directory.add((10 ** 6, "Zenith Glass", "", ""))
+        self.assertEqual(len(directory), 3)
+        self.assertEqual(self.names(directory.search("zen")), ["Zenith Glass"])
+        self.assertEqual(directory.search("acme t"), [])
+
+    def test_saves_and_deletes_update_the_shared_directory(self):
+        search_clients("a")  # builds it
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = make_invoice(client_name="Atlas Metalworks")
+        self.assertEqual(self.names(search_clients("atlas")), ["Atlas Metalworks"])
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.delete()
+        self.assertEqual(search_clients("atlas"), [])
+
+    def test_renamed_client_leaves_the_old_name(self):
+        search_clients("a")  # builds it
+        bravo = Invoice.objects.get(client_name="Bravo Interiors")
+        bravo.client_name = "Beacon Joinery"
+        with self.captureOnCommitCallbacks(execute=True):
+            bravo.save()
+        self.assertEqual(search_clients("bravo"), [])
+        self.assertEqual(self.names(search_clients("beacon")), ["Beacon Joinery"])
+
+    def test_renaming_the_latest_invoice_falls_back_to_the_previous_one(self):
+        search_clients("a")
+        latest = Invoice.objects.filter(client_name="Acme Trading LLC").latest("pk")
+        latest.client_name = "Acme Holdings"
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.save()
+        self.assertEqual(search_clients("acme t")[0]["address"], "Old address")
+        self.assertEqual(search_clients("acme h")[0]["address"], "Deira, Dubai")
+
+    def test_autocomplete_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("client_autocomplete"), {"q": "acme", "limit": "1"})
+        self.assertEqual(response.json(), {"results": [
+            {"name": "acme builders", "address": "Sharjah", "mobile_number": "0501234567"},
+        ]})
+        response = self.client.get(reverse("client_autocomplete"), {"q": "a", "limit": "junk"})
+        self.assertEqual(len(response.json()["results"]), 3)
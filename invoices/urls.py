@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -5,16 +6,31 @@ from . import views
 
 from django.contrib.auth import views as auth_views
 
+# Under ASGI the downloads are served by async views (see views.py)
+if getattr(settings, 'ASYNC_VIEWS', False):
+    pdf_view, quotation_view, csv_view = (
+        views.generate_pdf_async, views.generate_quotation_async, views.export_analytics_csv_async,
+    )
+else:
+    pdf_view, quotation_view, csv_view = views.generate_pdf, views.generate_quotation, views.export_analytics_csv
+
 urlpatterns = [
     path('', views.invoice_list, name='home'), # Redirect root to list (which is protected)
     path('add/', views.invoice_create, name='invoice_create'),
+    path('clients/autocomplete/', views.client_autocomplete, name='client_autocomplete'),
+    path('import/', views.invoice_import, name='invoice_import'),
     path('list/', views.invoice_list, name='invoice_list'),
-    path('generate-pdf/<int:pk>/', views.generate_pdf, name='generate_pdf'),
-    path('generate-quotation/<int:pk>/', views.generate_quotation, name='generate_quotation'),
+    path('generate-pdf/<int:pk>/', pdf_view, name='generate_pdf'),
+    path('generate-quotation/<int:pk>/', quotation_view, name='generate_quotation'),
+    path('render-jobs/<int:pk>/', views.render_job_status, name='render_job_status'),
+    path('export/', views.bulk_export, name='bulk_export'),
+    path('export/progress/<slug:token>/', views.bulk_export_progress, name='bulk_export_progress'),
     path('update/<int:pk>/', views.invoice_update, name='invoice_update'),
+    path('finalise/<int:pk>/', views.invoice_finalise, name='invoice_finalise'),
     path('delete/<int:pk>/', views.invoice_delete, name='invoice_delete'),
     path('analytics/', views.analytics_view, name='analytics'),
-    path('analytics/export/', views.export_analytics_csv, name='export_analytics_csv'),
+    path('analytics/export/', csv_view, name='export_analytics_csv'),
+    path('metrics', views.metrics, name='metrics'),
     
     # Auth URLs
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
@@ -0,0 +1,51 @@
+"""
+VAT rates and amounts.
+
+Rates come from ``settings.VAT_RATES``, a list of ``(effective_from, rate)``
+pairs; an invoice uses the latest rate in effect on its date. ``Invoice.save``
+and the bulk writers store the resulting ``vat_amount`` and ``total_with_vat``
+(rounded half-up to fils), so the PDFs, analytics and CSV export all read the
+same figures and totals can be summed in SQL.
+"""
+
+from bisect import bisect_right
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+
+CENTS = Decimal('0.01')
+DEFAULT_RATES = [('2018-01-01', '0.05')]
+
+_table = None
+
+
+def rate_table():
+    global _table
+    configured = getattr(settings, 'VAT_RATES', DEFAULT_RATES)
+    if _table is None or _table[0] is not configured:
+        rows = sorted((parse_date(str(start)), Decimal(str(rate))) for start, rate in configured)
+        _table = (configured, [start for start, _rate in rows], [rate for _start, rate in rows])
+    return _table[1], _table[2]
+
+
+def rate_for(day):
+    starts, rates = rate_table()
+    if isinstance(day, str):
+        day = parse_date(day)
+    index = bisect_right(starts, day or date.today()) - 1
+    # Dates before the first entry use the earliest configured rate.
+    return rates[max(index, 0)]
+
+
+def compute(amount, day):
+    """Return ``(vat_amount, total_with_vat)`` for an amount on a given date."""
+    amount = Decimal(str(amount))
+    vat_amount = (amount * rate_for(day)).quantize(CENTS, rounding=ROUND_HALF_UP)
+    return vat_amount, amount + vat_amount
+
+
+def apply(invoice):
+    invoice.vat_amount, invoice.total_with_vat = compute(invoice.amount, invoice.date)
+    return invoice
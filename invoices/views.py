@@ -1,16 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from .models import Invoice
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from .models import ArchivedPDF, Invoice, RenderJob
+from .analytics import cached_dashboard, resolve_period, to_date
 from .forms import InvoiceForm
-from decimal import Decimal
+from .importer import detect_format, import_file
+from .csv_export import analytics_csv_rows, async_chunks, gzip_stream, stream_csv
+from .client_directory import search_clients
+from .bulk_export import ExportProgress, get_progress, iter_rendered, stream_merged_pdf, stream_zip
+from . import list_cache
+from .archive import archived_response, finalise, find_archived, is_finalised
+from .jobs import enqueue
+from .metrics import registry as metrics_registry
+from .pagination import CursorPage
+from .pdf_cache import get_pdf_cache
+from .pdf_spool import PDFLimitExceeded, render_pdf_file, wants_file_mode
+from .rendering import TEMPLATES, html_to_pdf, html_to_pdf_async, pdf_filename, render_html
+from .search import search_invoices
+from .vat import rate_for as vat_rate_for
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
-from datetime import timedelta
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 import json
 
 
@@ -20,26 +37,6 @@ import json
 def superuser_only(user):
     return user.is_superuser
 
-from num2words import num2words
-
-
-# ================================
-# Helper: Amount to words
-# ================================
-def num_to_words(num):
-    try:
-        # Split into Dirhams and Fils
-        int_part = int(num)
-        decimal_part = int(round((num - int_part) * 100))
-        
-        words = num2words(int_part).replace(',', '') + " Dirhams"
-        if decimal_part > 0:
-            words += " and " + num2words(decimal_part).replace(',', '') + " Fils"
-        
-        return words + " Only"
-    except Exception:
-        return f"{num} AED"
-
 
 # ================================
 # Create Invoice / Quotation
@@ -63,86 +60,217 @@ def invoice_create(request):
     return render(request, "invoices/create_invoice.html", {
         "form": form,
         "title": "Create Quotation",
-        "created_invoice": created_invoice
+        "created_invoice": created_invoice,
+        "vat_rate": vat_rate_for(timezone.now().date()),
     })
 
 
 # ================================
-# Invoice List (Search + Filter + Pagination)
+# Client autocomplete (create form)
 # ================================
 @login_required
 @user_passes_test(superuser_only, login_url="login")
-def invoice_list(request):
-    invoices_qs = Invoice.objects.all().order_by("-created_at")
+def client_autocomplete(request):
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    return JsonResponse({"results": search_clients(request.GET.get("q", ""), limit)})
+
+
+# ================================
+# Bulk Import (CSV / JSON Lines)
+# ================================
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def invoice_import(request):
+    report = None
+    if request.method == "POST" and request.FILES.get("file"):
+        upload = request.FILES["file"]
+        fmt = request.POST.get("format") or detect_format(upload.name)
+        report = import_file(upload.file, fmt)
+
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse(report.as_dict())
+
+    return render(request, "invoices/import_invoices.html", {"report": report})
+
+
+# ================================
+# Helper: List search + date filters
+# ================================
+def filter_invoices(params):
+    # ``finalised`` lets the table hide the actions a finalised invoice refuses.
+    invoices_qs = Invoice.objects.annotate(
+        finalised=Exists(ArchivedPDF.objects.filter(invoice=OuterRef("pk"))),
+    ).order_by("-created_at", "-id")
 
     # Search
-    search_query = request.GET.get("search", "")
+    search_query = params.get("search", "")
     if search_query:
-        invoices_qs = invoices_qs.filter(
-            Q(client_name__icontains=search_query) |
-            Q(invoice_number__icontains=search_query) |
-            Q(reference_no__icontains=search_query)
-        )
+        invoices_qs = search_invoices(invoices_qs, search_query)
 
     # Date filter
-    date_from = request.GET.get("date_from", "")
-    date_to = request.GET.get("date_to", "")
+    date_from = params.get("date_from", "")
+    date_to = params.get("date_to", "")
 
     if date_from:
         invoices_qs = invoices_qs.filter(date__gte=date_from)
     if date_to:
         invoices_qs = invoices_qs.filter(date__lte=date_to)
 
-    # Pagination
-    paginator = Paginator(invoices_qs, 10)
-    page_number = request.GET.get("page")
-    invoices = paginator.get_page(page_number)
+    return invoices_qs, search_query, date_from, date_to
 
-    context = {
+
+# ================================
+# Invoice List (Search + Filter + Pagination)
+# ================================
+def invoice_list_context(params):
+    invoices_qs, search_query, date_from, date_to = filter_invoices(params)
+
+    # Pagination: cursors by default; ?page=N keeps numbered pages working for old links
+    page_number = params.get("page")
+    cursor_mode = getattr(settings, "INVOICE_LIST_PAGINATION", "cursor") == "cursor" and not page_number
+    if cursor_mode:
+        invoices = CursorPage(
+            invoices_qs,
+            page_size=10,
+            after=params.get("after"),
+            before=params.get("before"),
+            filtered=bool(search_query or date_from or date_to),
+        )
+    else:
+        paginator = Paginator(invoices_qs, 10)
+        invoices = paginator.get_page(page_number)
+
+    return {
         "invoices": invoices,
+        "cursor_mode": cursor_mode,
         "search_query": search_query,
         "date_from": date_from,
         "date_to": date_to,
     }
 
+
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def invoice_list(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return render(request, "invoices/partials/invoice_table_partial.html", context)
+        response = invoice_table_response(request)
+    else:
+        response = render(request, "invoices/invoice_list.html", invoice_list_context(request.GET))
+    # The same URL serves the page and the table partial.
+    patch_vary_headers(response, ["X-Requested-With"])
+    return response
 
-    return render(request, "invoices/invoice_list.html", context)
 
+def invoice_table_response(request):
+    # Cached per distinct query until the next invoice write; a browser that
+    # already holds the current table gets a 304 without the list query.
+    params = list_cache.normalize(request.GET)
+    key = list_cache.table_key(params)
+    etag = quote_etag(key)
 
-# ================================
-# Invoice PDF
-# ================================
-@login_required
-@user_passes_test(superuser_only, login_url="login")
-def generate_pdf(request, pk):
-    invoice = get_object_or_404(Invoice, pk=pk)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
 
-    vat_rate = Decimal("0.05")
-    vat_amount = invoice.amount * vat_rate
-    total_with_vat = invoice.amount + vat_amount
+    html = list_cache.get_html(key)
+    if html is None:
+        html = render_to_string(
+            "invoices/partials/invoice_table_partial.html", invoice_list_context(params), request,
+        )
+        list_cache.set_html(key, html)
 
-    context = {
-        "invoice": invoice,
-        "vat_amount": round(vat_amount, 2),
-        "total_with_vat": round(total_with_vat, 2),
-        "amount_in_words": num_to_words(total_with_vat),
-    }
+    response = HttpResponse(html)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    template = get_template("invoices/pdf_template.html")
-    html = template.render(context)
 
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'filename="invoice_{invoice.reference_no}.pdf"'
+# ================================
+# Helper: Cached PDF response
+# ================================
+PDF_URL_NAMES = {
+    "invoice": "generate_pdf",
+    "quotation": "generate_quotation",
+}
+
+
+def wants_async_render(request):
+    default = "1" if getattr(settings, "PDF_RENDER_ASYNC", False) else "0"
+    return request.GET.get("async", default) == "1"
+
+
+def pdf_response(request, invoice, kind):
+    archived = find_archived(invoice, kind)
+    if archived is not None:
+        return archived_pdf_response(request, invoice, kind, archived)
+
+    html, key = render_html(invoice, kind)
+    etag = quote_etag(key)
+    last_modified = invoice.updated_at.timestamp()
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if wants_file_mode(request, invoice):
+        # Long documents: rendered to a temp file and streamed, not cached.
+        try:
+            pdf_file, _stats = render_pdf_file(html)
+        except PDFLimitExceeded as exc:
+            return HttpResponse(str(exc))
+        return pdf_file_response(invoice, kind, pdf_file, etag, last_modified)
+
+    cache = get_pdf_cache()
+    pdf = cache.get(invoice.pk, key)
+    if pdf is None:
+        if wants_async_render(request):
+            return render_job_response(request, enqueue(invoice, kind, key))
+        pdf = html_to_pdf(html)
+        if pdf is None:
+            return HttpResponse("PDF generation error")
+        cache.set(invoice.pk, key, pdf)
+
+    return pdf_file_response(invoice, kind, pdf, etag, last_modified)
+
+
+def archived_pdf_response(request, invoice, kind, archived):
+    # Finalised invoices are served from the archive as issued.
+    etag = quote_etag(archived.sha256)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = archived_response(archived, pdf_filename(invoice, kind))
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("PDF generation error")
 
+def pdf_file_response(invoice, kind, pdf, etag, last_modified):
+    # ``pdf`` is bytes, or an open file that is streamed out in chunks.
+    if isinstance(pdf, bytes):
+        response = HttpResponse(pdf, content_type="application/pdf")
+    else:
+        response = FileResponse(pdf, content_type="application/pdf")
+    response["Content-Disposition"] = f'filename="{pdf_filename(invoice, kind)}"'
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 
+# ================================
+# Invoice PDF
+# ================================
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def generate_pdf(request, pk):
+    invoice = get_object_or_404(Invoice, pk=pk)
+    return pdf_response(request, invoice, "invoice")
+
+
 # ================================
 # Quotation PDF
 # ================================
@@ -150,31 +278,73 @@ def generate_pdf(request, pk):
 @user_passes_test(superuser_only, login_url="login")
 def generate_quotation(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk)
+    return pdf_response(request, invoice, "quotation")
 
-    vat_rate = Decimal("0.05")
-    vat_amount = invoice.amount * vat_rate
-    total_with_vat = invoice.amount + vat_amount
 
-    context = {
-        "invoice": invoice,
-        "vat_amount": round(vat_amount, 2),
-        "total_with_vat": round(total_with_vat, 2),
-        "amount_in_words": num_to_words(total_with_vat),
+# ================================
+# Background render jobs
+# ================================
+def render_job_payload(job):
+    payload = {
+        "id": job.pk,
+        "status": job.status,
+        "status_url": reverse("render_job_status", args=[job.pk]),
     }
+    if job.status == RenderJob.STATUS_DONE:
+        payload["url"] = reverse(PDF_URL_NAMES[job.kind], args=[job.invoice_id])
+    elif job.status == RenderJob.STATUS_FAILED:
+        payload["error"] = job.error
+    return payload
+
+
+def render_job_response(request, job):
+    payload = render_job_payload(job)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(payload, status=202)
+    return render(request, "invoices/render_pending.html", {"job": job, "payload": payload}, status=202)
 
-    template = get_template("invoices/quotation_template.html")
-    html = template.render(context)
 
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'filename="quotation_{invoice.reference_no}.pdf"'
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def render_job_status(request, pk):
+    job = get_object_or_404(RenderJob, pk=pk)
+    return JsonResponse(render_job_payload(job))
 
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("PDF generation error")
 
+# ================================
+# Bulk PDF Export (ZIP / merged PDF)
+# ================================
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def bulk_export(request):
+    invoices_qs, _search, _date_from, _date_to = filter_invoices(request.GET)
+
+    kind = request.GET.get("kind", "invoice")
+    if kind not in TEMPLATES:
+        kind = "invoice"
+    output = request.GET.get("format", "zip")
+
+    total = invoices_qs.count()
+    progress = ExportProgress(request.GET.get("token", ""), total)
+    rendered = iter_rendered(invoices_qs, kind)
+    stamp = timezone.now().strftime("%Y%m%d")
+
+    if output == "pdf":
+        response = StreamingHttpResponse(stream_merged_pdf(rendered, progress), content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="{kind}s_{stamp}.pdf"'
+    else:
+        response = StreamingHttpResponse(stream_zip(rendered, kind, progress), content_type="application/zip")
+        response["Content-Disposition"] = f'attachment; filename="{kind}s_{stamp}.zip"'
+    response["X-Export-Total"] = str(total)
     return response
 
 
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def bulk_export_progress(request, token):
+    return JsonResponse(get_progress(token) or {"state": "pending"})
+
+
 # ================================
 # Update Invoice
 # ================================
@@ -182,6 +352,8 @@ def generate_quotation(request, pk):
 @user_passes_test(superuser_only, login_url="login")
 def invoice_update(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk)
+    if is_finalised(invoice):
+        return HttpResponseForbidden("This invoice is finalised; its PDFs are archived and it can no longer be edited.")
 
     if request.method == "POST":
         form = InvoiceForm(request.POST, instance=invoice)
@@ -193,7 +365,26 @@ def invoice_update(request, pk):
 
     return render(request, "invoices/create_invoice.html", {
         "form": form,
-        "title": "Edit Quotation"
+        "title": "Edit Quotation",
+        "vat_rate": vat_rate_for(invoice.date),
+    })
+
+
+# ================================
+# Finalise Invoice (archive its PDFs)
+# ================================
+@login_required
+@user_passes_test(superuser_only, login_url="login")
+def invoice_finalise(request, pk):
+    invoice = get_object_or_404(Invoice, pk=pk)
+
+    if request.method == "POST":
+        finalise(invoice)
+        return redirect("invoice_list")
+
+    return render(request, "invoices/invoice_confirm_finalise.html", {
+        "invoice": invoice,
+        "finalised": is_finalised(invoice),
     })
 
 
@@ -204,6 +395,8 @@ def invoice_update(request, pk):
 @user_passes_test(superuser_only, login_url="login")
 def invoice_delete(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk)
+    if is_finalised(invoice):
+        return HttpResponseForbidden("This invoice is finalised; its PDFs are archived and it can no longer be deleted.")
 
     if request.method == "POST":
         invoice.delete()
@@ -220,74 +413,24 @@ def invoice_delete(request, pk):
 @login_required
 @user_passes_test(superuser_only, login_url="login")
 def analytics_view(request):
-    # ... (existing analytics_view code)
-    # [keeping existing implementation for brevity in thought, but I will write the full view in replacement content]
-    # Monthly Revenue for Chart
-    last_6_months = []
-    today = timezone.now().date()
-    for i in range(5, -1, -1):
-        month_date = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
-        month_name = month_date.strftime('%b %Y')
-        next_month = (month_date + timedelta(days=32)).replace(day=1)
-    # Determine period and raw dates
     period = request.GET.get('period', 'custom')
     date_from_raw = request.GET.get('date_from', '')
     date_to_raw = request.GET.get('date_to', '')
-    
     today = timezone.now().date()
-    
-    # Filter calculation defaults
-    date_from = date_from_raw
-    date_to = date_to_raw
-    
-    if period == 'this_month':
-        date_from = today.replace(day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-    elif period == 'last_month':
-        last_month = (today.replace(day=1) - timedelta(days=1))
-        date_from = last_month.replace(day=1).strftime('%Y-%m-%d')
-        date_to = last_month.strftime('%Y-%m-%d')
-    elif period == 'last_6_months':
-        date_from = (today.replace(day=1) - timedelta(days=150)).replace(day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-    elif period == 'this_year':
-        date_from = today.replace(month=1, day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-
-    # Base filtered queryset for the whole page (Summary, Chart, Clients)
-    all_invoices = Invoice.objects.all()
-    if date_from:
-        all_invoices = all_invoices.filter(date__gte=date_from)
-    if date_to:
-        all_invoices = all_invoices.filter(date__lte=date_to)
-
-    # Summary Stats (Now based on the active range)
-    total_revenue = all_invoices.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_vat = float(total_revenue) * 0.05
-    total_count = all_invoices.count()
-    avg_value = float(total_revenue) / total_count if total_count > 0 else 0
-
-    # Chart data (always 6-month perspective for trend)
-    last_6_months_data = []
-    for i in range(5, -1, -1):
-        m_date = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
-        m_name = m_date.strftime('%b %Y')
-        n_month = (m_date + timedelta(days=32)).replace(day=1)
-        m_rev = Invoice.objects.filter(date__gte=m_date, date__lt=n_month).aggregate(Sum('amount'))['amount__sum'] or 0
-        last_6_months_data.append({'month': m_name, 'revenue': float(m_rev)})
-
-    # Top clients from the filtered queryset
-    top_clients = all_invoices.values('client_name').annotate(total=Sum('amount'), count=Count('id')).order_by('-total')[:5]
-    for client in top_clients:
-        client['total'] = float(client['total'])
+    date_from, date_to = resolve_period(period, date_from_raw, date_to_raw, today)
+
+    # Summary, 6-month chart and top clients for the active range, from the
+    # rollups through the analytics result cache
+    data = cached_dashboard(to_date(date_from), to_date(date_to), today)
+    summary = data['summary']
 
     context = {
-        'revenue_data': json.dumps(last_6_months_data),
-        'top_clients': top_clients,
-        'total_revenue': total_revenue,
-        'total_vat': total_vat,
-        'total_count': total_count,
-        'avg_value': avg_value,
+        'revenue_data': json.dumps(data['chart']),
+        'top_clients': data['top_clients'],
+        'total_revenue': summary['total_revenue'],
+        'total_vat': summary['total_vat'],
+        'total_count': summary['total_count'],
+        'avg_value': summary['avg_value'],
         'date_from': date_from_raw,
         'date_to': date_to_raw,
         'period': period,
@@ -295,79 +438,113 @@ def analytics_view(request):
     return render(request, 'invoices/analytics.html', context)
 
 
-import csv
+# ================================
+# Analytics CSV Export (streamed)
+# ================================
 @login_required
 @user_passes_test(superuser_only, login_url="login")
 def export_analytics_csv(request):
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="business_analytics_{timezone.now().strftime("%Y%m%d")}.csv"'
-    
-    # Add BOM for Excel compatibility
-    response.write('\ufeff')
+    chunks, content_type, filename = analytics_csv_export(request)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-    writer = csv.writer(response)
-    
-    # Summary Header
-    writer.writerow(['BUSINESS ANALYTICS SUMMARY'])
-    writer.writerow(['Generated At', timezone.now().strftime('%Y-%m-%d %H:%M:%S')])
-    
+
+def analytics_csv_export(request):
     # Period filters
     period = request.GET.get('period', 'custom')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    
     today = timezone.now().date()
-    
-    if period == 'this_month':
-        date_from = today.replace(day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-    elif period == 'last_month':
-        last_month = (today.replace(day=1) - timedelta(days=1))
-        date_from = last_month.replace(day=1).strftime('%Y-%m-%d')
-        date_to = (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m-%d')
-    elif period == 'last_6_months':
-        date_from = (today.replace(day=1) - timedelta(days=150)).replace(day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-    elif period == 'this_year':
-        date_from = today.replace(month=1, day=1).strftime('%Y-%m-%d')
-        date_to = today.strftime('%Y-%m-%d')
-        
-    if date_from or date_to:
-        writer.writerow(['Filters', f'Period: {period} | From: {date_from or "All"} | To: {date_to or "All"}'])
-    
-    writer.writerow([])
-    
-    all_invoices = Invoice.objects.all().order_by('-date')
-    if date_from:
-        all_invoices = all_invoices.filter(date__gte=date_from)
-    if date_to:
-        all_invoices = all_invoices.filter(date__lte=date_to)
-    total_revenue = all_invoices.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_vat = float(total_revenue) * 0.05
-    
-    writer.writerow(['Metric', 'Value'])
-    writer.writerow(['Total Revenue (AED)', f"{total_revenue:.2f}"])
-    writer.writerow(['Total VAT Collected (AED)', f"{total_vat:.2f}"])
-    writer.writerow(['Total Quotations', all_invoices.count()])
-    writer.writerow(['Average Value (AED)', f"{(float(total_revenue)/all_invoices.count() if all_invoices.count() > 0 else 0):.2f}"])
-    writer.writerow([])
-    
-    # Detailed Data
-    writer.writerow(['DETAILED INVOICE DATA'])
-    writer.writerow(['Date', 'Invoice No', 'Client Name', 'Reference', 'Amount (AED)', 'VAT (5%)', 'Total (AED)'])
-    
-    for invoice in all_invoices:
-        amt = float(invoice.amount)
-        vat = amt * 0.05
-        writer.writerow([
-            invoice.date.strftime('%d/%m/%Y'),
-            invoice.invoice_number,
-            invoice.client_name,
-            invoice.reference_no,
-            f"{amt:.2f}",
-            f"{vat:.2f}",
-            f"{(amt + vat):.2f}"
-        ])
-        
-    return response
+    date_from, date_to = resolve_period(period, request.GET.get('date_from', ''), request.GET.get('date_to', ''), today)
 
+    rows = analytics_csv_rows(period, date_from, date_to, to_date(date_from), to_date(date_to))
+    filename = f"business_analytics_{timezone.now().strftime('%Y%m%d')}.csv"
+
+    if request.GET.get('format') == 'gz':
+        return gzip_stream(stream_csv(rows)), 'application/gzip', filename + '.gz'
+    return stream_csv(rows), 'text/csv; charset=utf-8', filename
+
+
+# ================================
+# Metrics (Prometheus text format)
+# ================================
+def metrics(request):
+    # Scraped locally without a session; superusers can also view it in a browser.
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed and not request.user.is_superuser:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ================================
+# Async (ASGI) PDF + CSV downloads
+# ================================
+# Same responses as generate_pdf / generate_quotation / export_analytics_csv,
+# selected in urls.py with ASYNC_VIEWS=1. Renders run in a process pool and
+# CSV chunks are streamed from the event loop, so a worker serves many
+# downloads at once instead of one per thread.
+async def superuser_redirect(request):
+    # Async stand-in for @login_required + @user_passes_test(superuser_only).
+    allowed = await sync_to_async(lambda: request.user.is_authenticated and superuser_only(request.user))()
+    if allowed:
+        return None
+    return redirect_to_login(request.get_full_path(), "login")
+
+
+async def pdf_response_async(request, pk, kind):
+    denied = await superuser_redirect(request)
+    if denied is not None:
+        return denied
+    try:
+        invoice = await Invoice.objects.aget(pk=pk)
+    except Invoice.DoesNotExist:
+        raise Http404("No Invoice matches the given query.")
+
+    archived = await sync_to_async(find_archived)(invoice, kind)
+    if archived is not None:
+        return await sync_to_async(archived_pdf_response)(request, invoice, kind, archived)
+
+    html, key = await sync_to_async(render_html)(invoice, kind)
+    etag = quote_etag(key)
+    last_modified = invoice.updated_at.timestamp()
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if wants_file_mode(request, invoice):
+        try:
+            pdf_file, _stats = await sync_to_async(render_pdf_file, thread_sensitive=False)(html)
+        except PDFLimitExceeded as exc:
+            return HttpResponse(str(exc))
+        return pdf_file_response(invoice, kind, pdf_file, etag, last_modified)
+
+    cache = get_pdf_cache()
+    pdf = await sync_to_async(cache.get)(invoice.pk, key)
+    if pdf is None:
+        if wants_async_render(request):
+            job = await sync_to_async(enqueue)(invoice, kind, key)
+            return await sync_to_async(render_job_response)(request, job)
+        pdf = await html_to_pdf_async(html)
+        if pdf is None:
+            return HttpResponse("PDF generation error")
+        await sync_to_async(cache.set)(invoice.pk, key, pdf)
+
+    return pdf_file_response(invoice, kind, pdf, etag, last_modified)
+
+
+async def generate_pdf_async(request, pk):
+    return await pdf_response_async(request, pk, "invoice")
+
+
+async def generate_quotation_async(request, pk):
+    return await pdf_response_async(request, pk, "quotation")
+
+
+async def export_analytics_csv_async(request):
+    denied = await superuser_redirect(request)
+    if denied is not None:
+        return denied
+    chunks, content_type, filename = analytics_csv_export(request)
+    response = StreamingHttpResponse(async_chunks(chunks), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response